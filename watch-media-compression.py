@@ -1,18 +1,40 @@
 #!/usr/bin/python3
 """Media compression monitor script"""
+import argparse
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import ctypes
 import datetime
+import gzip
+import http.server
+import mmap
 import os
 import fnmatch
+import glob
+import hashlib
 import re
+import select
+import shutil
+import signal
+import stat
+import struct
 import time
 import pprint
+import queue
 import subprocess
+import sys
 import textwrap
+import threading
 import urllib.request
 import requests
 import json
+import lzma
 import objectpath
 from pathlib import Path
+import numpy as np
 import psutil
 from colorama import Fore
 from colorama import Style
@@ -38,6 +60,16 @@ class Utils:
             
         return "{:02d}:{:02d}:{:02d}".format(int(hours), int(minutes), int(seconds))
 
+    @staticmethod
+    def get_terminal_size():
+        """ Gets the console rows and columns, with a default when there is no terminal."""
+
+        try:
+            size = os.get_terminal_size(sys.__stdout__.fileno())
+        except (AttributeError, ValueError, OSError):
+            return 80, 240
+        return size.lines, size.columns
+
     @staticmethod
     def clear():
         """Clears the screen"""
@@ -54,7 +86,7 @@ class Form:
     y = 1
     width = 0
     height = 0
-    rows, columns = os.popen('stty size', 'r').read().split()
+    rows, columns = Utils.get_terminal_size()
 
     #pylint: disable-msg=too-many-arguments
     def __init__(self, name, x=1, y=1, width=0, height=0):
@@ -82,205 +114,4311 @@ class Form:
         """ Adds content to the form."""
         self.content += line
 
-    def render(self):
-        """Renders the form on the console."""
+    def render(self):
+        """Renders the form on the console."""
+
+        if int(self.width) == 0:
+            self.width = len(max(self.content.split("\n"), key=len))
+        if int(self.width) > int(self.columns):
+            self.width = int(self.columns)
+            
+        if int(self.width) < len(self.name) + 10:
+            self.width = len(self.name) + 10
+        
+        if self.height == 0:
+            self.height = len(self.content.split("\n"))
+            
+        render_y = self.y
+        row_count = 0
+        output = ""
+        
+        output += self.set_cursor_position(self.y, self.x)
+        output += (
+            (
+                Style.BRIGHT +
+                Fore.BLUE +
+                chr(213) + 4*chr(205) + " {} {}" + chr(184) +
+                Style.RESET_ALL
+            ).format(
+                str(self.name),
+                (self.width  - len(self.name) - 7)*chr(205)
+            )
+        )
+
+        render_y += 1
+        row_count += 1
+        for line in self.content.split("\n"):
+            if row_count <= self.height:
+                output += self.set_cursor_position(render_y, self.x)
+                output += " "*(self.width+1)
+                
+                output += self.set_cursor_position(render_y, self.x)
+                if line.strip() == '_':
+                    output += (
+                        (
+                            Style.BRIGHT + Fore.BLUE + chr(179) +
+                            Style.RESET_ALL + "{:<{width}}" +
+                            # Style.BRIGHT + Fore.BLUE + chr(179) +
+                            Style.RESET_ALL + "\n"
+                        ).format(
+                            " ",
+                            width=self.width
+                        )
+                    )
+                    render_y += 1
+                    row_count += 1
+                    
+                elif line.strip() != '':
+                    output += (
+                        (
+                            Style.BRIGHT + Fore.BLUE + chr(179) +
+                            Style.RESET_ALL + "{:<{width}}" +
+                            # Style.BRIGHT + Fore.BLUE + chr(179) +
+                            Style.RESET_ALL + "\n"
+                        ).format(
+                            line,
+                            width=self.width
+                        )
+                    )
+
+                    render_y += 1
+                    row_count += 1
+
+        while row_count <= self.height:
+            output += self.set_cursor_position(render_y, self.x)
+            output += (
+                (
+                    Style.BRIGHT + Fore.BLUE + chr(179) + "{}" + Style.RESET_ALL
+                ).format((self.width)*" ")
+            )
+            render_y += 1
+            row_count += 1
+
+        output += self.set_cursor_position(render_y, self.x)
+        output += (Style.BRIGHT + Fore.BLUE + chr(192) + "{}" + chr(217) + Style.RESET_ALL).format((self.width-1)*chr(196))
+        render_y += 1
+        row_count += 1
+
+        print(output)
+        return render_y
+
+
+class IOBudget:
+    """ Limits library scans to a number of stats per second per disk, slowing further while the encode's disk is busy."""
+
+    busy_factor = 0.1
+    check_interval = 1
+
+    def __init__(self, rate=0, busy_util=80):
+        """ Initializes the IOBudget Object."""
+
+        self.rate = rate
+        self.busy_util = busy_util
+        self.encode_disk = None
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.busy = None
+        self.checked = 0
+        self.utils = {}
+
+    @staticmethod
+    @contextlib.contextmanager
+    def idle():
+        """ Runs the calling thread, and any command it starts, in the idle I/O class for the duration."""
+
+        try:
+            thread = psutil.Process(threading.get_native_id())
+            previous = thread.ionice()
+            thread.ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (AttributeError, psutil.Error):
+            thread = None
+        try:
+            yield
+        finally:
+            if thread is not None:
+                try:
+                    if previous.ioclass in (psutil.IOPRIO_CLASS_RT, psutil.IOPRIO_CLASS_BE):
+                        thread.ionice(previous.ioclass, previous.value)
+                    else:
+                        thread.ionice(previous.ioclass)
+                except (psutil.Error, ValueError):
+                    pass
+
+    def get_util(self, disk):
+        """ Gets the utilization percent of a disk over the last check interval."""
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.checked >= self.check_interval:
+                counters = psutil.disk_io_counters(perdisk=True) or {}
+                busy = {name : getattr(c, 'busy_time', 0) for name, c in counters.items()}
+                if self.busy is not None:
+                    elapsed = now - self.checked
+                    self.utils = {
+                        name : min(100.0, (value - self.busy.get(name, value)) / elapsed / 10)
+                        for name, value in busy.items()
+                    }
+                self.busy = busy
+                self.checked = now
+            return self.utils.get(disk, 0.0)
+
+    def spend(self, disk=None, count=1):
+        """ Takes stats from a disk's budget, sleeping once it runs out. A disk of None may be any disk."""
+
+        if not self.rate:
+            return
+        disk = os.path.basename(disk or '') or None
+        rate = self.rate
+        if (
+                self.encode_disk and disk in (None, self.encode_disk) and
+                self.get_util(self.encode_disk) >= self.busy_util
+        ):
+            rate *= self.busy_factor
+
+        with self.lock:
+            now = time.monotonic()
+            tokens, last = self.buckets.get(disk, (rate, now))
+            # at most a second's worth saved up, so an idle spell is not paid out in one burst
+            tokens = min(rate, tokens + (now - last) * rate) - count
+            self.buckets[disk] = (tokens, now)
+        if tokens < 0:
+            time.sleep(-tokens / rate)
+
+
+class Media:
+    """ Object that handles media file information."""
+
+    sniffer = None
+    tree_cache = None
+    tree_lock = threading.Lock()
+    hot_files = frozenset()
+    budget = IOBudget()
+
+    @staticmethod
+    def get_tree_cache():
+        """ Gets the subtree cache shared by every walk, loading it on first use."""
+
+        with Media.tree_lock:
+            if Media.tree_cache is None:
+                if Media.sniffer is None:
+                    Media.sniffer = CodecSniffer()
+                Media.tree_cache = SubtreeCache(sniffer=Media.sniffer, budget=Media.budget, hot=Media.hot_files)
+        return Media.tree_cache
+
+    @staticmethod
+    def set_hot_files(paths):
+        """ Marks the files the encode reads and writes, whose sizes every walk checks."""
+
+        # replaced whole, the device walkers may be reading the old set
+        Media.hot_files = frozenset(os.path.normpath(path) for path in paths if path)
+        with Media.tree_lock:
+            if Media.tree_cache is not None:
+                Media.tree_cache.hot = Media.hot_files
+
+    @staticmethod
+    def scan_tree(path, skip=(), disk=None):
+        """ Gets the total size and the x264 and x265 media files below a path, rereading only changed directories."""
+
+        # mountpoints below the path are walked by their own device's worker
+        cache = Media.get_tree_cache()
+        with Media.budget.idle():
+            cache.refresh(path, skip, disk)
+        tree = cache.get_tree(path, skip)
+        cache.sniffer.save()
+        cache.save()
+        return tree
+
+    @staticmethod
+    def get_media_files(path, hevc):
+        """ Gets the x264 or x265 media files on the specified path, classified by their headers."""
+
+        return Media.scan_tree(path)['x265' if hevc else 'x264']
+
+    @staticmethod
+    def get_x264_count(path):
+        """ Gets the count of x264 media files on the specified path."""
+
+        return Media.get_media_files(path, False)
+
+    @staticmethod
+    def get_x265_count(path):
+        """ Gets the count of x265 media files on the specified path."""
+
+        return Media.get_media_files(path, True)
+
+    @staticmethod
+    def get_last_line():
+        """ Gets the last line of the nohup compression log."""
+
+        with open("/home/plex/h265/mediaCompression.nohup.out") as nohup_file:
+            lines = nohup_file.readlines()
+            if len(lines) > 0:
+                last = lines[-1]
+            else:
+                last = ""
+
+        return last
+
+    @staticmethod
+    def get_progress(line):
+        """ Gets the encoded position in milliseconds and the speed from an ffmpeg progress line."""
+
+        time_match = re.search(r'([0-9]+:[0-9]+:[0-9.]+)', line)
+        speed_match = re.search(r'([0-9]+[.]*[0-9]*)x', line)
+        if time_match is None or speed_match is None:
+            return None
+
+        hour, minute, second = time_match.group(0).split(':')
+        dest_millis = ( (int(hour) * 60 * 60 * 1000) + (int(minute) * 60 * 1000) + (int(float(second)) * 1000) )
+        return dest_millis, float(speed_match.group(1))
+
+    @staticmethod
+    def get_conversion_speeds():
+        """ Gets the speeds tracked in the nohup compression log."""
+        speeds = []
+        with open("/home/plex/h265/mediaCompression.nohup.out") as nohup_file:
+            for line in nohup_file:
+                line = re.findall(r'speed=([0-9\.]+)', line)
+                if line:
+                    speeds.append(float(line[0]))
+
+        return speeds
+        
+        
+
+class CodecSniffer:
+    """ Classifies media files as AVC or HEVC from their container headers, cached by inode and mtime."""
+
+    path = "/home/plex/h265/codec_cache.json"
+    head_bytes = 16384
+    matroska_magic = b'\x1a\x45\xdf\xa3'
+    matroska_codecs = {b'V_MPEGH/ISO/HEVC' : 'hevc', b'V_MPEG4/ISO/AVC' : 'avc'}
+    mp4_codecs = {b'hvc1' : 'hevc', b'hev1' : 'hevc', b'avc1' : 'avc', b'avc3' : 'avc'}
+
+    def __init__(self, path=None):
+        """ Initializes the CodecSniffer Object."""
+
+        if path is not None:
+            self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as cache_file:
+                    self.entries = json.load(cache_file)
+            except ValueError:
+                self.entries = {}
+
+    @classmethod
+    def sniff_matroska(cls, data):
+        """ Gets the codec of the first video CodecID element in a Matroska header."""
+
+        for match in re.finditer(b'\x86([\x81-\xfe])V_', data):
+            length = match.group(1)[0] & 0x7f
+            codec = cls.matroska_codecs.get(data[match.start() + 2:match.start() + 2 + length])
+            if codec:
+                return codec
+        return None
+
+    @classmethod
+    def sniff_mp4(cls, fd, size):
+        """ Gets the codec of the first video sample entry in an MP4 moov box, wherever it is stored."""
+
+        offset = 0
+        while offset + 8 <= size:
+            header = os.pread(fd, 16, offset)
+            box_size, box_type = struct.unpack('>I4s', header[:8])
+            if box_size == 1:
+                box_size = struct.unpack('>Q', header[8:16])[0]
+            elif box_size == 0:
+                box_size = size - offset
+            if box_size < 8:
+                return None
+
+            if box_type == b'moov':
+                data = os.pread(fd, min(box_size, cls.head_bytes), offset)
+                for match in re.finditer(b'stsd', data):
+                    # version and flags, entry count and entry size come before the sample entry type
+                    codec = cls.mp4_codecs.get(data[match.end() + 12:match.end() + 16])
+                    if codec:
+                        return codec
+                return None
+            offset += box_size
+        return None
+
+    @classmethod
+    def sniff(cls, path, size):
+        """ Gets the video codec of a file from its header, or None if it could not be told."""
+
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            head = os.pread(fd, cls.head_bytes, 0)
+            if head.startswith(cls.matroska_magic):
+                return cls.sniff_matroska(head)
+            if head[4:8] == b'ftyp':
+                return cls.sniff_mp4(fd, size)
+        finally:
+            os.close(fd)
+        return None
+
+    @staticmethod
+    def classify_name(path):
+        """ Classifies a file by its name, as done before headers were read."""
+
+        file_name = os.path.basename(path)
+        if fnmatch.fnmatch(file_name, '*265*') or fnmatch.fnmatch(file_name, '*HEVC*'):
+            return 'hevc'
+        return 'avc'
+
+    def classify(self, path, stat):
+        """ Gets 'hevc' or 'avc' for a file, falling back to its name when the header is unknown."""
+
+        key = "{}:{}".format(stat.st_dev, stat.st_ino)
+        entry = self.entries.get(key)
+        if entry is None or entry['mtime'] != int(stat.st_mtime):
+            try:
+                codec = self.sniff(path, stat.st_size)
+            except (OSError, struct.error):
+                codec = None
+            entry = {'mtime' : int(stat.st_mtime), 'codec' : codec or ''}
+            self.entries[key] = entry
+            self.dirty = True
+
+        return entry['codec'] or self.classify_name(path)
+
+    def save(self):
+        """ Writes the cache back to disk if it changed."""
+
+        if self.dirty:
+            try:
+                with open(self.path + '.tmp', 'w') as cache_file:
+                    # copied since the report walks several roots in threads
+                    json.dump(dict(self.entries), cache_file)
+                os.replace(self.path + '.tmp', self.path)
+            except OSError:
+                pass
+            self.dirty = False
+
+
+class SubtreeCache:
+    """ Keeps the bytes, file count and AVC/HEVC counts of every directory and of its whole subtree.
+
+    A directory is only listed again when its mtime changed, which adding, removing or renaming
+    a file does, or when one of its files changed size in place, and the difference is then added
+    to its ancestors alone. Sizes changed in place are only looked for in the hot files, the ones
+    the encode reads and writes, and in each directory once per recheck interval."""
+
+    path = "/home/plex/h265/subtree_cache.json"
+    version = 1
+    media_size = 200000000
+    save_interval = 300
+    recheck_interval = 3600
+    fields = ['bytes', 'files', 'x264', 'x265', 'x264_bytes']
+
+    def __init__(self, path=None, sniffer=None, budget=None, hot=frozenset()):
+        """ Initializes the SubtreeCache Object."""
+
+        if path is not None:
+            self.path = path
+        self.sniffer = CodecSniffer() if sniffer is None else sniffer
+        self.budget = IOBudget() if budget is None else budget
+        self.hot = hot
+        self.records = {}
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.saved = 0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as cache_file:
+                    data = json.load(cache_file)
+                if data.get('version') == self.version:
+                    self.records = data['records']
+            except ValueError:
+                self.records = {}
+
+    @classmethod
+    def get_counts(cls, files):
+        """ Gets the aggregate fields of a directory's own files."""
+
+        counts = [0] * len(cls.fields)
+        for size, codec in files.values():
+            counts[0] += size
+            counts[1] += 1
+            if codec == 'x264':
+                counts[2] += 1
+                counts[4] += size
+            elif codec == 'x265':
+                counts[3] += 1
+        return counts
+
+    def read_dir(self, path, disk=None):
+        """ Lists a directory, classifying its media files, without touching the cache."""
+
+        record = {'mtime' : os.stat(path).st_mtime_ns, 'checked' : time.time(), 'dirs' : [], 'files' : {}}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                self.budget.spend(disk)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        record['dirs'].append(entry.name)
+                        continue
+                    file_stat = entry.stat()
+                except OSError:
+                    continue
+                if not stat.S_ISREG(file_stat.st_mode):
+                    continue
+
+                codec = None
+                if file_stat.st_size > self.media_size:
+                    codec = 'x265' if self.sniffer.classify(entry.path, file_stat) == 'hevc' else 'x264'
+                record['files'][entry.name] = [file_stat.st_size, codec]
+        record['own'] = self.get_counts(record['files'])
+        return record
+
+    def add(self, path, delta):
+        """ Adds a difference to the totals of a directory and of every cached ancestor."""
+
+        while True:
+            record = self.records.get(path)
+            if record is not None:
+                record['total'] = [a + b for a, b in zip(record['total'], delta)]
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+
+    def insert(self, path, record):
+        """ Caches a built directory, totalling its cached children and passing the difference to its ancestors.
+
+        Its ancestors only hear of it when its parent is already cached, since a parent cached later
+        totals its children itself, so a directory built by two walks at once still counts once."""
+
+        with self.lock:
+            # skipped children cached by another device's walk count too
+            record['total'] = list(record['own'])
+            for name in record['dirs']:
+                child = self.records.get(os.path.join(path, name))
+                if child is not None:
+                    record['total'] = [a + b for a, b in zip(record['total'], child['total'])]
+            previous = self.records.get(path)
+            self.records[path] = record
+            parent = os.path.dirname(path)
+            if parent != path and parent in self.records:
+                delta = record['total'] if previous is None else [a - b for a, b in zip(record['total'], previous['total'])]
+                self.add(parent, delta)
+            self.dirty = True
+
+    def build(self, path, skip, disk=None):
+        """ Reads a directory missing from the cache and everything below it."""
+
+        record = self.read_dir(path, disk)
+        for name in record['dirs']:
+            child = os.path.join(path, name)
+            if child not in skip:
+                try:
+                    self.build(child, skip, disk)
+                except OSError:
+                    pass
+        self.insert(path, record)
+
+    def resized(self, path, record, disk=None):
+        """ Checks whether a hot file of a cached directory, or any file once per recheck interval, changed size.
+
+        Writing a file in place leaves the directory's mtime alone."""
+
+        now = time.time()
+        # a cache loaded from disk starts its interval now rather than sweeping everything at once
+        if now - record.setdefault('checked', now) >= self.recheck_interval:
+            record['checked'] = now
+            names = list(record['files'])
+        else:
+            hot = self.hot
+            names = [os.path.basename(item) for item in hot if os.path.dirname(item) == path]
+        for name in names:
+            if name not in record['files']:
+                continue
+            size = record['files'][name][0]
+            self.budget.spend(disk)
+            try:
+                if os.stat(os.path.join(path, name)).st_size != size:
+                    return True
+            except OSError:
+                # a file that is gone changed the mtime, or will be noticed when it does
+                continue
+        return False
+
+    def remove(self, path):
+        """ Drops a directory that is gone and everything below it, taking its total off its ancestors."""
+
+        with self.lock:
+            record = self.records.get(path)
+            if record is None:
+                return
+            self.add(os.path.dirname(path), [-value for value in record['total']])
+            pending = [path]
+            while pending:
+                directory = pending.pop()
+                record = self.records.pop(directory, None)
+                if record is not None:
+                    pending += [os.path.join(directory, name) for name in record['dirs']]
+            self.dirty = True
+
+    def refresh(self, path, skip=(), disk=None):
+        """ Brings a subtree up to date, reading only the directories whose mtime changed."""
+
+        path = os.path.normpath(path)
+        skip = {os.path.normpath(item) for item in skip}
+        self.budget.spend(disk)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.remove(path)
+            return
+
+        record = self.records.get(path)
+        try:
+            if record is None:
+                self.build(path, skip, disk)
+                return
+            fresh = None
+            if record['mtime'] != mtime or self.resized(path, record, disk):
+                fresh = self.read_dir(path, disk)
+        except OSError:
+            return
+
+        if fresh is not None:
+            for name in set(record['dirs']) - set(fresh['dirs']):
+                self.remove(os.path.join(path, name))
+            with self.lock:
+                self.add(path, [a - b for a, b in zip(fresh['own'], record['own'])])
+                record.update(
+                    mtime=fresh['mtime'], checked=fresh['checked'], dirs=fresh['dirs'], files=fresh['files'], own=fresh['own']
+                )
+                self.dirty = True
+
+        for name in record['dirs']:
+            child = os.path.join(path, name)
+            if child not in skip:
+                self.refresh(child, skip, disk)
+
+    def get_tree(self, path, skip=()):
+        """ Gets the size and the x264 and x265 media files below a cached path, leaving out skipped subtrees."""
+
+        path = os.path.normpath(path)
+        skip = {os.path.normpath(item) for item in skip}
+        tree = {'size' : 0, 'x264' : [], 'x265' : []}
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            record = self.records.get(directory)
+            if record is None:
+                continue
+            tree['size'] += record['own'][0]
+            for name, (size, codec) in sorted(record['files'].items()):
+                if codec is not None:
+                    tree[codec].append({"path" : os.path.join(directory, name), "size" : size})
+            pending += [
+                child for child in (os.path.join(directory, name) for name in reversed(record['dirs']))
+                if child not in skip
+            ]
+        return tree
+
+    def get_files(self, path):
+        """ Gets every file below a cached path."""
+
+        files = []
+        pending = [os.path.normpath(path)]
+        while pending:
+            directory = pending.pop()
+            record = self.records.get(directory)
+            if record is not None:
+                files += [os.path.join(directory, name) for name in sorted(record['files'])]
+                pending += [os.path.join(directory, name) for name in reversed(record['dirs'])]
+        return files
+
+    def get_total(self, path):
+        """ Gets the aggregate fields of a cached subtree by name, or None when it is not cached."""
+
+        record = self.records.get(os.path.normpath(path))
+        if record is None:
+            return None
+        return dict(zip(self.fields, record['total']))
+
+    def get_offenders(self, paths, count):
+        """ Gets the folders directly below the paths with the most x264 bytes left, folders of the same name merged."""
+
+        paths = {os.path.normpath(path) for path in paths}
+        folders = {}
+        with self.lock:
+            for path in paths:
+                record = self.records.get(path)
+                for name in (record or {}).get('dirs', []):
+                    child = self.records.get(os.path.join(path, name))
+                    # a mountpoint below another path is a library part, not a folder
+                    if child is not None and os.path.join(path, name) not in paths:
+                        total = folders.setdefault(name, [0] * len(self.fields))
+                        folders[name] = [a + b for a, b in zip(total, child['total'])]
+        ranked = sorted(folders.items(), key=lambda item: -item[1][4])
+        return [[name] + total for name, total in ranked[:count] if total[4] > 0]
+
+    def save(self, force=False):
+        """ Writes the cache back to disk if it changed, at most once per save interval unless forced."""
+
+        with self.lock:
+            if not self.dirty or (not force and time.time() - self.saved < self.save_interval):
+                return
+            self.saved = time.time()
+            try:
+                with open(self.path + '.tmp', 'w') as cache_file:
+                    json.dump({'version' : self.version, 'records' : self.records}, cache_file)
+                os.replace(self.path + '.tmp', self.path)
+            except OSError:
+                pass
+            self.dirty = False
+
+
+class DeviceWalker:
+    """ Walks the mountpoints below a root with one worker per physical disk and merges the results."""
+
+    def __init__(self, partitions):
+        """ Initializes the DeviceWalker Object."""
+
+        self.partitions = partitions
+
+    @staticmethod
+    def get_disk(device):
+        """ Gets the physical disk of a partition device, /dev/sdb for /dev/sdb1 and /dev/nvme0n1 for /dev/nvme0n1p1."""
+
+        # disks whose names end in a digit number their partitions with a p
+        if re.search(r'(nvme\d+n\d+|mmcblk\d+|loop\d+|md\d+)(p\d+)?$', device):
+            return re.sub(r'p\d+$', '', device)
+        return re.sub(r'(?<=[a-z])\d+$', '', device)
+
+    def get_groups(self, root):
+        """ Gets the paths below a root to walk, grouped by the disk they are on."""
+
+        mounts = sorted(p.mountpoint for p in self.partitions if root in p.mountpoint)
+        groups = collections.OrderedDict()
+        for part in sorted(self.partitions, key=lambda x: x.mountpoint):
+            if part.mountpoint in mounts:
+                groups.setdefault(self.get_disk(part.device), []).append(part.mountpoint)
+        if root.rstrip('/') not in mounts:
+            # files stored on the root's own filesystem, outside every mountpoint
+            groups.setdefault('', []).append(root)
+        return groups, set(mounts)
+
+    def walk(self, root):
+        """ Walks every disk below a root in parallel, so a pass takes as long as the slowest disk."""
+
+        groups, mounts = self.get_groups(root)
+
+        def walk_disk(disk, paths):
+            return [(path, Media.scan_tree(path, mounts, disk)) for path in paths]
+
+        with concurrent.futures.ThreadPoolExecutor(max(1, len(groups))) as pool:
+            trees = collections.OrderedDict(
+                item for result in pool.map(walk_disk, groups.keys(), groups.values()) for item in result
+            )
+
+        # the cache already holds the root's total, mountpoints below it included
+        total = Media.get_tree_cache().get_total(root)
+        return {
+            'size' : total['bytes'] if total else sum(tree['size'] for tree in trees.values()),
+            'x264' : [item for tree in trees.values() for item in tree['x264']],
+            'x265' : [item for tree in trees.values() for item in tree['x265']],
+            'mounts' : {path : tree for path, tree in trees.items() if path in mounts}
+        }
+
+
+class OutputTracker:
+    """ Predicts the final size of the encode output from its growing size and the encoded position."""
+
+    window = 60
+
+    def __init__(self):
+        """ Initializes the OutputTracker Object."""
+
+        self.path = None
+        self.samples = collections.deque()
+
+    def sample(self, path, now, size, position):
+        """ Adds a size and position sample, starting over when the output file changes."""
+
+        if path != self.path or (self.samples and position < self.samples[-1][2]):
+            self.path = path
+            self.samples.clear()
+        if not self.samples or self.samples[-1][1:] != (size, position):
+            self.samples.append((now, size, position))
+        while len(self.samples) > 2 and now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def get_bit_rate(self):
+        """ Gets the output bitrate over the window, in bits per second of encoded media."""
+
+        if len(self.samples) < 2:
+            return None
+        _, first_size, first_position = self.samples[0]
+        _, last_size, last_position = self.samples[-1]
+        if last_position <= first_position:
+            return None
+        return (last_size - first_size) * 8 / ((last_position - first_position) / 1000)
+
+    def predict(self, src_millis, src_size):
+        """ Gets the live bitrate, predicted final size, projected savings and size ratio."""
+
+        if not self.samples or not src_millis or not src_size:
+            return None
+
+        _, size, position = self.samples[-1]
+        bit_rate = self.get_bit_rate()
+        if bit_rate is None:
+            if position <= 0:
+                return None
+            bit_rate = size * 8 / (position / 1000)
+
+        final_size = size + bit_rate * max(float(src_millis) - position, 0) / 1000 / 8
+        return {
+            'bit_rate' : int(bit_rate),
+            'size' : int(final_size),
+            'savings' : int(src_size - final_size),
+            'ratio' : final_size / src_size
+        }
+
+
+class DiskIOTracker:
+    """ Turns the cumulative per disk I/O counters into throughput, IOPS, await and utilization."""
+
+    virtual_prefixes = ('loop', 'ram', 'zram', 'dm-', 'md', 'sr')
+
+    def __init__(self):
+        """ Initializes the DiskIOTracker Object."""
+
+        self.previous = None
+        self.rates = {}
+
+    @classmethod
+    def is_disk(cls, name, counters):
+        """ Checks whether a counter is a whole physical disk, not a partition of a listed disk or a virtual device."""
+
+        disk = os.path.basename(DeviceWalker.get_disk('/dev/' + name))
+        return not name.startswith(cls.virtual_prefixes) and (disk == name or disk not in counters)
+
+    def sample(self, now, counters):
+        """ Gets the rates between this and the previous sample, keeping the last rates when no time passed."""
+
+        if self.previous is not None and now > self.previous[0]:
+            then, previous = self.previous
+            elapsed = now - then
+            self.rates = {}
+            for name, current in counters.items():
+                if not self.is_disk(name, counters) or name not in previous:
+                    continue
+                reads, writes, read_bytes, write_bytes, read_time, write_time, busy_time = (
+                    max(0, new - old) for new, old in zip(current, previous[name])
+                )
+                ops = reads + writes
+                self.rates[name] = {
+                    'read' : read_bytes / elapsed,
+                    'write' : write_bytes / elapsed,
+                    'iops' : ops / elapsed,
+                    'await' : (read_time + write_time) / ops if ops else 0.0,
+                    'util' : min(100.0, busy_time / elapsed / 10)
+                }
+        if self.previous is None or now > self.previous[0]:
+            self.previous = (now, counters)
+        return self.rates
+
+
+class Analytics:
+    """ Compression ratio statistics and free space projections for the library."""
+
+    resolutions = ['480p', '576p', '720p', '1080p', '2160p', 'other']
+    # file size stands in for the bitrate class until per file bitrates are known
+    size_bands = np.array([5e8, 1e9, 2e9, 4e9, 8e9, 16e9])
+    min_samples = 3
+    default_ratio = 0.5
+
+    resolution_pattern = re.compile(r'(480|576|720|1080|2160)[pi]', re.IGNORECASE)
+    codec_pattern = re.compile(r'[\W_]*\b(x26[45]|h\.?26[45]|hevc|avc)\b[\W_]*', re.IGNORECASE)
+
+    def __init__(self, avc_files, hevc_files, history=None):
+        """ Initializes the Analytics Object and fits the ratio table."""
+
+        self.ratio_table = np.full((len(self.resolutions), len(self.size_bands) + 1), np.nan)
+        self.samples = 0
+
+        avc_sizes, avc_classes = self.classify(avc_files)
+        hevc_sizes, _ = self.classify(hevc_files)
+        if len(avc_sizes) > 0 and len(hevc_sizes) > 0:
+            self.fallback_ratio = float(np.mean(hevc_sizes) / np.mean(avc_sizes))
+        else:
+            self.fallback_ratio = self.default_ratio
+
+        sources, ratios = self.get_pairs(avc_files, hevc_files)
+        for entry in (history or []):
+            if entry.get('source_size', 0) > 0 and entry.get('dest_size', 0) > 0:
+                sources.append({'path' : entry['source'], 'size' : entry['source_size']})
+                ratios.append(entry['dest_size'] / entry['source_size'])
+
+        self.fit(sources, np.array(ratios, dtype=float))
+
+    @classmethod
+    def classify(cls, files):
+        """ Gets the size and the (resolution, size band) class of each file."""
+
+        sizes = np.fromiter((item['size'] for item in files), dtype=float, count=len(files))
+        classes = np.empty((len(files), 2), dtype=int)
+        classes[:, 0] = np.fromiter(
+            (cls.get_resolution(item['path']) for item in files), dtype=int, count=len(files)
+        )
+        classes[:, 1] = np.digitize(sizes, cls.size_bands)
+        return sizes, classes
+
+    @classmethod
+    def get_resolution(cls, path):
+        """ Gets the resolution class index from a file name."""
+
+        match = cls.resolution_pattern.search(os.path.basename(path))
+        if match is None:
+            return len(cls.resolutions) - 1
+        return cls.resolutions.index(match.group(1) + 'p')
+
+    @classmethod
+    def get_title(cls, path):
+        """ Gets a file's directory and its name with the codec tags removed."""
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        return (os.path.dirname(path), cls.codec_pattern.sub(' ', name).strip().lower())
+
+    @classmethod
+    def get_pairs(cls, avc_files, hevc_files):
+        """ Finds titles that exist in both forms, returning the AVC files and their HEVC/AVC ratios."""
+
+        hevc_sizes = {}
+        for item in hevc_files:
+            hevc_sizes[cls.get_title(item['path'])] = item['size']
+
+        sources = []
+        ratios = []
+        for item in avc_files:
+            hevc_size = hevc_sizes.get(cls.get_title(item['path']))
+            if hevc_size and item['size'] > 0:
+                sources.append(item)
+                ratios.append(hevc_size / item['size'])
+
+        return sources, ratios
+
+    def fit(self, sources, ratios):
+        """ Fills the ratio table with the median ratio of each class, falling back to coarser classes."""
+
+        self.samples = len(ratios)
+        if self.samples == 0:
+            self.ratio_table[:] = self.fallback_ratio
+            return
+
+        _, classes = self.classify(sources)
+        overall = float(np.median(ratios))
+        for resolution in range(len(self.resolutions)):
+            in_resolution = classes[:, 0] == resolution
+            if np.count_nonzero(in_resolution) >= self.min_samples:
+                resolution_ratio = float(np.median(ratios[in_resolution]))
+            else:
+                resolution_ratio = overall
+
+            for band in range(self.ratio_table.shape[1]):
+                in_class = in_resolution & (classes[:, 1] == band)
+                if np.count_nonzero(in_class) >= self.min_samples:
+                    self.ratio_table[resolution, band] = np.median(ratios[in_class])
+                else:
+                    self.ratio_table[resolution, band] = resolution_ratio
+
+    def get_ratios(self, files):
+        """ Gets the expected HEVC/AVC size ratio of each file."""
+
+        _, classes = self.classify(files)
+        return self.ratio_table[classes[:, 0], classes[:, 1]]
+
+    def get_savings(self, files):
+        """ Gets the bytes expected to be reclaimed by converting the specified AVC files."""
+
+        if len(files) == 0:
+            return 0
+        sizes, classes = self.classify(files)
+        return int(np.sum(sizes * (1 - self.ratio_table[classes[:, 0], classes[:, 1]])))
+
+    def get_projection(self, used, avc_files):
+        """ Gets the bytes used once the specified AVC files have been converted."""
+
+        return max(0, int(used - self.get_savings(avc_files)))
+
+
+class EncodeModel:
+    """ Least squares model of encode seconds per second of media, fitted from the encode history."""
+
+    min_samples = 8
+
+    def __init__(self, history):
+        """ Initializes the EncodeModel Object and fits the coefficients."""
+
+        self.coefficients = None
+        self.fallback = None
+        self.samples = 0
+
+        rows = []
+        costs = []
+        for entry in history:
+            speed = entry.get('final_speed') or entry.get('speed', 0)
+            if speed <= 0:
+                continue
+            costs.append(1 / speed)
+            if entry.get('height'):
+                rows.append((self.get_features(entry), 1 / speed))
+
+        if costs:
+            self.fallback = float(np.median(costs))
+        if len(rows) >= self.min_samples:
+            features = np.array([row[0] for row in rows])
+            targets = np.array([row[1] for row in rows])
+            self.coefficients = np.linalg.lstsq(features, targets, rcond=None)[0]
+            self.samples = len(rows)
+
+    @staticmethod
+    def get_features(source):
+        """ Gets the model inputs of a file: a constant, megapixels, bitrate in Mbps and frame rate."""
+
+        def number(key):
+            try:
+                return float(source.get(key) or 0)
+            except ValueError:
+                return 0.0
+
+        return [1.0, number('height') * number('width') / 1e6, number('bit_rate') / 1e6, number('frame_rate')]
+
+    def predict(self, source):
+        """ Gets the predicted wall clock seconds to encode a file, or None without any history."""
+
+        try:
+            duration = float(source.get('duration') or 0) / 1000
+        except ValueError:
+            return None
+        if duration <= 0:
+            return None
+
+        if self.coefficients is not None and source.get('height'):
+            cost = float(np.dot(self.get_features(source), self.coefficients))
+            if cost > 0:
+                return duration * cost
+        if self.fallback is None:
+            return None
+        return duration * self.fallback
+
+
+class MetadataCache:
+    """ Persistent MediaInfo results for library files, invalidated by size and mtime."""
+
+    path = "/home/plex/h265/metadata_cache.json"
+    version = 2
+
+    def __init__(self, path=None):
+        """ Initializes the MetadataCache Object."""
+
+        if path is not None:
+            self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as cache_file:
+                    self.entries = json.load(cache_file)
+            except ValueError:
+                self.entries = {}
+
+    @staticmethod
+    def extract(path):
+        """ Parses a media file, returning the fields stored in the cache."""
+
+        entry = {
+            'duration' : 0,
+            'width' : 0,
+            'height' : 0,
+            'bit_rate' : 0,
+            'frame_rate' : 0,
+            'codec' : '',
+            'audio' : []
+        }
+        video = False
+        for track in MediaInfo.parse(path).tracks:
+            if track.track_type == 'General' and track.duration and not video:
+                entry['duration'] = float(track.duration)
+            elif track.track_type == 'Video' and not video:
+                video = True
+                entry['duration'] = float(track.duration or entry['duration'])
+                entry['width'] = int(track.width or 0)
+                entry['height'] = int(track.height or 0)
+                entry['bit_rate'] = int(float(track.bit_rate or 0))
+                entry['frame_rate'] = float(track.frame_rate or 0)
+                entry['codec'] = str(track.format or '')
+            elif track.track_type == 'Audio':
+                entry['audio'].append({
+                    'codec' : str(track.format or ''),
+                    'channels' : MetadataCache.to_int(track.channel_s),
+                    'language' : str(track.language or ''),
+                    'bit_rate' : MetadataCache.to_int(track.bit_rate)
+                })
+        return entry
+
+    @staticmethod
+    def to_int(value):
+        """ Converts a MediaInfo field to an int, which may be missing or hold several values."""
+
+        try:
+            return int(float(str(value).split(' / ')[0]))
+        except ValueError:
+            return 0
+
+    def get(self, path, stat=None):
+        """ Gets the cached metadata of a file, or None if it is missing or stale."""
+
+        entry = self.entries.get(path)
+        if entry is None or entry.get('version') != self.version:
+            return None
+
+        if stat is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+        if entry['size'] != stat.st_size or entry['mtime'] != int(stat.st_mtime):
+            return None
+        return entry
+
+    def lookup(self, path, size):
+        """ Gets the cached metadata of a file if its size still matches, without a stat."""
+
+        entry = self.entries.get(path)
+        if entry is None or entry.get('version') != self.version or entry['size'] != size:
+            return None
+        return entry
+
+    def store(self, path, stat, entry):
+        """ Stores the metadata of a file along with the stat it was probed at."""
+
+        entry['size'] = stat.st_size
+        entry['mtime'] = int(stat.st_mtime)
+        entry['version'] = self.version
+        self.entries[path] = entry
+        self.dirty = True
+        return entry
+
+    def probe(self, path, stat=None):
+        """ Parses a file and stores the result in the cache."""
+
+        if stat is None:
+            stat = os.stat(path)
+        return self.store(path, stat, self.extract(path))
+
+    def prune(self, paths):
+        """ Drops the entries of files that are no longer in the library."""
+
+        for path in set(self.entries) - set(paths):
+            del self.entries[path]
+            self.dirty = True
+
+    def save(self):
+        """ Writes the cache back to disk if it changed."""
+
+        if self.dirty:
+            try:
+                with open(self.path + '.tmp', 'w') as cache_file:
+                    json.dump(self.entries, cache_file)
+                os.replace(self.path + '.tmp', self.path)
+            except OSError:
+                pass
+            self.dirty = False
+
+
+class QueuePlanner:
+    """ Ranks the x264 backlog by the bytes an encode is expected to save per hour of encoding."""
+
+    roots = ['/Storage/Television/', '/Storage/Movies/']
+    default_bit_rate = 8000000
+    default_speed = 1.0
+
+    def __init__(self, cache, history, speeds):
+        """ Initializes the QueuePlanner Object."""
+
+        self.cache = cache
+        self.history = history
+        self.speeds = speeds
+
+    def get_speed_table(self):
+        """ Gets the median historical encode speed of each resolution class."""
+
+        overall = float(np.median(self.speeds)) if len(self.speeds) > 0 else self.default_speed
+        table = np.full(len(Analytics.resolutions), overall)
+
+        # the last reading covers the whole encode, the mean of the readings leans on its start
+        history = [
+            (entry['source'], entry.get('final_speed') or entry.get('speed', 0)) for entry in self.history
+        ]
+        history = [(source, speed) for source, speed in history if speed > 0]
+        if history:
+            resolutions = np.array([Analytics.get_resolution(source) for source, speed in history])
+            speeds = np.array([speed for source, speed in history])
+            for resolution in range(len(Analytics.resolutions)):
+                if np.count_nonzero(resolutions == resolution) >= Analytics.min_samples:
+                    table[resolution] = np.median(speeds[resolutions == resolution])
+        return table
+
+    def get_durations(self, files, probe_seconds=0):
+        """ Gets each file's duration in seconds, from the cache, a time boxed probe or its size."""
+
+        durations = np.zeros(len(files))
+        missing = []
+        for index, item in enumerate(files):
+            # the walk already has the size, only the files probed below are stat'ed
+            entry = self.cache.lookup(item['path'], item['size'])
+            if entry is None:
+                missing.append(index)
+            else:
+                durations[index] = entry['duration'] / 1000
+
+        deadline = time.time() + probe_seconds
+        for index in missing:
+            if time.time() >= deadline:
+                break
+            try:
+                durations[index] = self.cache.probe(files[index]['path'])['duration'] / 1000
+            except Exception:
+                pass
+
+        # estimate the rest from the median bitrate of the probed files
+        sizes = np.array([item['size'] for item in files], dtype=float)
+        known = durations > 0
+        bit_rate = self.default_bit_rate
+        if np.any(known):
+            bit_rate = float(np.median(sizes[known] * 8 / durations[known]))
+        durations[~known] = sizes[~known] * 8 / bit_rate
+        return durations
+
+    def rank(self, avc_files, hevc_files, probe_seconds=0):
+        """ Gets the backlog ordered by expected bytes saved per encode hour."""
+
+        if len(avc_files) == 0:
+            return []
+
+        analytics = Analytics(avc_files, hevc_files, self.history)
+        sizes = np.array([item['size'] for item in avc_files], dtype=float)
+        saved = sizes * (1 - analytics.get_ratios(avc_files))
+
+        _, classes = Analytics.classify(avc_files)
+        speeds = self.get_speed_table()[classes[:, 0]]
+        hours = np.maximum(self.get_durations(avc_files, probe_seconds) / speeds / 3600, 1 / 60)
+
+        scores = saved / hours
+        ranked = []
+        for index in np.argsort(-scores, kind='stable'):
+            ranked.append({
+                'path' : avc_files[index]['path'],
+                'size' : int(sizes[index]),
+                'saved' : int(saved[index]),
+                'hours' : float(hours[index]),
+                'score' : float(scores[index])
+            })
+        return ranked
+
+    @staticmethod
+    def write_queue(ranked, path):
+        """ Writes the ranked paths to a queue file, one per line."""
+
+        with open(path + '.tmp', 'w') as queue_file:
+            for item in ranked:
+                queue_file.write(item['path'] + "\n")
+        os.replace(path + '.tmp', path)
+
+    def plan(self, queue_path, probe_seconds=0):
+        """ Ranks the whole library and writes the queue file, returning the ranking."""
+
+        avc_files = []
+        hevc_files = []
+        for root in self.roots:
+            # one walk gives both lists
+            tree = Media.scan_tree(root)
+            avc_files += tree['x264']
+            hevc_files += tree['x265']
+
+        ranked = self.rank(avc_files, hevc_files, probe_seconds)
+        self.cache.prune([item['path'] for item in avc_files + hevc_files])
+        self.cache.save()
+        self.write_queue(ranked, queue_path)
+        return ranked
+
+
+class MetadataScanner:
+    """ Fills the metadata cache for the whole library with a pool of low priority MediaInfo workers."""
+
+    roots = QueuePlanner.roots
+    save_interval = 30
+
+    def __init__(self, cache, workers=None, rate=4.0):
+        """ Initializes the MetadataScanner Object."""
+
+        self.cache = cache
+        self.workers = workers or max(1, (os.cpu_count() or 1) // 4)
+        self.rate = rate
+        self.failed = 0
+
+    @staticmethod
+    def lower_priority():
+        """ Keeps a worker from competing with the encoder for CPU and disk time."""
+
+        os.nice(19)
+        try:
+            psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (AttributeError, psutil.Error):
+            pass
+
+    def get_pending(self):
+        """ Gets the library files with no fresh cache entry, resuming any earlier scan."""
+
+        paths = []
+        for root in self.roots:
+            paths += [item['path'] for item in Media.get_x264_count(root) + Media.get_x265_count(root)]
+        self.cache.prune(paths)
+
+        pending = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.cache.get(path, stat) is None:
+                pending.append((path, stat))
+        return pending
+
+    def scan(self, pending):
+        """ Probes the pending files in parallel, at most rate files per second."""
+
+        started = time.time()
+        saved = started
+        submitted = 0
+        in_flight = {}
+        pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=self.lower_priority)
+        try:
+            while submitted < len(pending) or in_flight:
+                while submitted < len(pending) and len(in_flight) < 2 * self.workers:
+                    if self.rate > 0 and started + submitted / self.rate > time.time():
+                        break
+                    path, stat = pending[submitted]
+                    in_flight[pool.submit(MetadataCache.extract, path)] = (path, stat)
+                    submitted += 1
+
+                done, _ = concurrent.futures.wait(in_flight, timeout=0.25, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    path, stat = in_flight.pop(future)
+                    try:
+                        self.cache.store(path, stat, future.result())
+                    except Exception as error:
+                        # remembered so a broken file is not retried until it changes
+                        self.cache.store(path, stat, {'duration' : 0, 'error' : str(error)})
+                        self.failed += 1
+
+                if time.time() - saved >= self.save_interval:
+                    self.cache.save()
+                    saved = time.time()
+                    print("{} / {} files probed".format(submitted - len(in_flight), len(pending)))
+        finally:
+            pool.shutdown(cancel_futures=True)
+            self.cache.save()
+        return submitted
+
+
+class RebalancePlanner:
+    """ Plans moves of whole series and movie folders that bring each device to its target size."""
+
+    chunk_size = 4 * 1024 * 1024
+    busy_factor = 0.25
+    temp_suffix = '.rebalance'
+
+    def __init__(self, path, tolerance=0.01):
+        """ Initializes the RebalancePlanner Object."""
+
+        self.path = path
+        self.tolerance = tolerance
+        self.devices = sorted(
+            [p for p in psutil.disk_partitions() if path in p.mountpoint],
+            key=lambda x: x.mountpoint
+        )
+
+    @staticmethod
+    def get_tree_size(path):
+        """ Gets the total size of every file below a folder."""
+
+        total = 0
+        for d_name, sd_name, f_list in os.walk(path):
+            for file_name in f_list:
+                try:
+                    total += os.lstat(os.path.join(d_name, file_name)).st_size
+                except OSError:
+                    pass
+        return total
+
+    def get_folders(self):
+        """ Gets the size of every top level folder on each device."""
+
+        folders = {}
+        for device in self.devices:
+            folders[device.mountpoint] = {}
+            for entry in os.scandir(device.mountpoint):
+                if (
+                        entry.is_dir(follow_symlinks=False) and entry.name != 'lost+found' and
+                        not entry.name.endswith(self.temp_suffix)
+                ):
+                    folders[device.mountpoint][entry.name] = self.get_tree_size(entry.path)
+        return folders
+
+    def plan(self, folders):
+        """ Gets the moves, largest first, that bring every device within tolerance of the target.
+
+        Each donor device moves the largest folder that still fits under its excess
+        to the receiver with the smallest deficit that can hold it (best fit), which
+        keeps the number of bytes moved close to the total excess. When nothing fits,
+        the smallest folder that brings the donor within tolerance is used instead.
+        A folder never goes to a device that already has a folder of the same name,
+        as series split across devices do, since the copy would merge into it.
+        """
+
+        sizes = {mount: sum(dirs.values()) for mount, dirs in folders.items()}
+        if len(sizes) < 2:
+            return [], sizes, 0
+
+        target = sum(sizes.values()) / len(sizes)
+        slack = target * self.tolerance
+        free = {device.mountpoint: psutil.disk_usage(device.mountpoint).free for device in self.devices}
+        candidates = {
+            mount: sorted(
+                [(size, name) for name, size in dirs.items()],
+                reverse=True
+            ) for mount, dirs in folders.items()
+        }
+
+        moves = []
+        for donor in sorted(sizes, key=lambda mount: sizes[mount], reverse=True):
+            while sizes[donor] - target > slack:
+                excess = sizes[donor] - target
+                move = None
+                overshoot = None
+                for size, name in candidates[donor]:
+                    receivers = [
+                        mount for mount in sizes
+                        if mount != donor and
+                        name not in folders[mount] and
+                        size <= target + slack - sizes[mount] and
+                        size < free.get(mount, 0)
+                    ]
+                    if not receivers:
+                        continue
+                    receiver = min(receivers, key=lambda mount: target - sizes[mount] - size)
+                    if size <= excess:
+                        move = (size, name, receiver)
+                        break
+                    if size - excess <= slack:
+                        # candidates are largest first, so this ends on the smallest overshoot
+                        overshoot = (size, name, receiver)
+
+                if move is None:
+                    move = overshoot
+                if move is None:
+                    break
+
+                size, name, receiver = move
+                candidates[donor].remove((size, name))
+                sizes[donor] -= size
+                sizes[receiver] += size
+                free[receiver] = free.get(receiver, 0) - size
+                folders[receiver][name] = size
+                moves.append({
+                    'source' : os.path.join(donor, name),
+                    'dest' : os.path.join(receiver, name),
+                    'size' : size
+                })
+
+        return moves, sizes, int(target)
+
+    def report(self, folders, moves, sizes, target):
+        """ Describes the plan as a dry run."""
+
+        output = "Target size per device: {:,} (+/- {:,})\n\n".format(target, int(target * self.tolerance))
+        output += "{:<40} {:>20} {:>20} {:>20}\n".format('MOUNTPOINT', 'CURRENT', 'PLANNED', 'DELTA')
+        for mount in sorted(folders):
+            current = sum(folders[mount].values())
+            output += "{:<40} {:>20,} {:>20,} {:>20,}\n".format(mount, current, sizes[mount], sizes[mount] - target)
+
+        output += "\n{:>20}  {}\n".format('SIZE', 'MOVE')
+        for move in moves:
+            output += "{:>20,}  {} -> {}\n".format(move['size'], move['source'], move['dest'])
+        output += "\n{} folders, {:,} bytes to move\n".format(len(moves), sum(move['size'] for move in moves))
+        return output
+
+    def get_encode_paths(self):
+        """ Gets the media and transcoder files the running encode has open."""
+
+        paths = []
+        for proc in psutil.process_iter(attrs=['name']):
+            if 'ffmpeg' in (proc.info['name'] or ''):
+                try:
+                    paths += [f.path for f in proc.open_files()]
+                except psutil.Error:
+                    pass
+        return paths
+
+    def is_busy(self, mounts):
+        """ Checks whether the running encode is reading or writing any of the specified mounts."""
+
+        return any(path.startswith(mount + '/') for path in self.get_encode_paths() for mount in mounts)
+
+    def copy_file(self, source, dest, rate, mounts):
+        """ Copies one file at no more than rate bytes per second, slowing down while the encode shares a device."""
+
+        busy = self.is_busy(mounts)
+        checked = time.time()
+        with open(source, 'rb') as source_file, open(dest, 'wb') as dest_file:
+            started = time.time()
+            copied = 0
+            while True:
+                chunk = source_file.read(self.chunk_size)
+                if not chunk:
+                    break
+                dest_file.write(chunk)
+                copied += len(chunk)
+
+                if time.time() - checked > 5:
+                    busy = self.is_busy(mounts)
+                    checked = time.time()
+
+                allowed = rate * (self.busy_factor if busy else 1)
+                delay = copied / allowed - (time.time() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                if busy:
+                    # restart the rate window so a busy period is not paid back at full speed
+                    started = time.time()
+                    copied = 0
+        shutil.copystat(source, dest)
+
+    def execute(self, moves, rate):
+        """ Performs the moves, copying under a temporary name and verifying before renaming it and removing the source."""
+
+        try:
+            psutil.Process().ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (AttributeError, psutil.Error):
+            pass
+
+        for move in moves:
+            if self.is_busy([move['source']]):
+                print("Skipping {}, it is being encoded".format(move['source']))
+                continue
+
+            if os.path.lexists(move['dest']):
+                print("Skipping {}, {} already exists".format(move['source'], move['dest']))
+                continue
+
+            mounts = [os.path.dirname(move['source']), os.path.dirname(move['dest'])]
+            temp = os.path.join(os.path.dirname(move['dest']), '.' + os.path.basename(move['dest']) + self.temp_suffix)
+            print("Moving {} -> {} ({:,} bytes)".format(move['source'], move['dest'], move['size']))
+            for d_name, sd_name, f_list in os.walk(move['source']):
+                dest_dir = os.path.join(temp, os.path.relpath(d_name, move['source']))
+                os.makedirs(dest_dir, exist_ok=True)
+                for file_name in f_list:
+                    self.copy_file(os.path.join(d_name, file_name), os.path.join(dest_dir, file_name), rate, mounts)
+
+            if self.get_tree_size(temp) != self.get_tree_size(move['source']):
+                print("Size mismatch after copying {}, leaving the source in place".format(move['source']))
+                shutil.rmtree(temp)
+                continue
+            if os.path.lexists(move['dest']):
+                print("Skipping {}, {} appeared while copying".format(move['source'], move['dest']))
+                shutil.rmtree(temp)
+                continue
+            os.rename(temp, move['dest'])
+            shutil.rmtree(move['source'])
+
+
+class ThermalGovernor:
+    """ Holds the CPU near a target temperature by narrowing the encoder's CPU affinity or pausing it."""
+
+    log_path = "/home/plex/h265/thermal_governor.log"
+    interval = 10
+    hysteresis = 3
+    retry_interval = 600
+    speed_weight = 0.3
+
+    def __init__(self, sensor, progress, targets=None, target=72, min_cpus=1, log_path=None):
+        """ Initializes the ThermalGovernor Object."""
+
+        self.sensor = sensor
+        self.progress = progress
+        self.targets = self.find_encoders if targets is None else targets
+        self.target = target
+        if log_path is not None:
+            self.log_path = log_path
+        self.all_cpus = sorted(os.sched_getaffinity(0))
+        self.cpus = len(self.all_cpus)
+        self.min_cpus = min(min_cpus, self.cpus)
+        self.step_size = max(1, self.cpus // 8)
+        self.paused = False
+        self.speeds = {}
+        self.narrowed = {}
+        self.managed = set()
+        self.stopped = set()
+        self.sample = None
+        self.last = None
+
+    @staticmethod
+    def find_encoders():
+        """ Gets the pids of the running ffmpeg processes."""
+
+        return [p.pid for p in psutil.process_iter(['name']) if 'ffmpeg' in (p.info['name'] or '')]
+
+    def get_speed(self, now):
+        """ Gets the encode speed since the last step from the position moved over the time taken, or None.
+
+        ffmpeg's own speed is averaged since the encode started, so it hardly tells one CPU count from another."""
+
+        progress = self.progress()
+        sample = self.sample
+        self.sample = None if progress is None else (now, progress[0], self.paused)
+        # a new encode, or a step spent paused, says nothing about the CPU count
+        if sample is None or progress is None or sample[2] or now <= sample[0] or progress[0] < sample[1]:
+            return None
+        return (progress[0] - sample[1]) / 1000 / (now - sample[0])
+
+    def decide(self, now, temp, speed):
+        """ Picks the next CPU count and pause state, returning the name of the action."""
+
+        if speed is not None and not self.paused:
+            previous = self.speeds.get(self.cpus)
+            self.speeds[self.cpus] = speed if previous is None else (
+                (1 - self.speed_weight) * previous + self.speed_weight * speed
+            )
+
+        if temp > self.target:
+            if self.cpus > self.min_cpus:
+                self.narrowed[self.cpus] = now
+                self.cpus = max(self.min_cpus, self.cpus - self.step_size)
+                return 'narrow'
+            if not self.paused:
+                self.paused = True
+                return 'pause'
+        elif temp < self.target - self.hysteresis:
+            if self.paused:
+                self.paused = False
+                return 'resume'
+            if self.cpus < len(self.all_cpus):
+                wider = min(len(self.all_cpus), self.cpus + self.step_size)
+                # a wider set that ran no faster, likely throttled, is only retried now and then
+                if (
+                        wider not in self.speeds or
+                        self.speeds[wider] > 1.02 * self.speeds.get(self.cpus, 0) or
+                        now - self.narrowed.get(wider, now) >= self.retry_interval
+                ):
+                    self.cpus = wider
+                    return 'widen'
+        return 'hold'
+
+    def apply(self, pids):
+        """ Applies the CPU set to every thread of the encoders and stops them, or continues the ones it stopped."""
+
+        cpus = set(self.all_cpus[:self.cpus])
+        for pid in pids:
+            try:
+                # affinity is per thread, and ffmpeg's worker threads already exist
+                process = psutil.Process(pid)
+                for thread in process.threads():
+                    os.sched_setaffinity(thread.id, cpus)
+                # an encoder stopped by someone else is theirs to continue
+                if self.paused and pid not in self.stopped and process.status() != psutil.STATUS_STOPPED:
+                    os.kill(pid, signal.SIGSTOP)
+                    self.stopped.add(pid)
+                elif not self.paused and pid in self.stopped:
+                    os.kill(pid, signal.SIGCONT)
+                    self.stopped.discard(pid)
+                self.managed.add(pid)
+            except (OSError, psutil.Error):
+                self.managed.discard(pid)
+                self.stopped.discard(pid)
+
+    def holding(self):
+        """ Checks whether the governor has an encoder stopped."""
+
+        return len(self.stopped) > 0
+
+    def log(self, now, temp, speed, action):
+        """ Appends a decision to the governor log."""
+
+        with open(self.log_path, 'a') as log_file:
+            log_file.write("{} temp={:.1f} speed={} cpus={}/{} paused={} action={}\n".format(
+                datetime.datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+                temp,
+                "-" if speed is None else "{:.2f}".format(speed),
+                self.cpus,
+                len(self.all_cpus),
+                self.paused,
+                action
+            ))
+
+    def step(self, now):
+        """ Makes a decision if the interval passed, returning the action or None."""
+
+        if self.last is not None and now - self.last < self.interval:
+            return None
+        self.last = now
+
+        temp = float(self.sensor())
+        speed = self.get_speed(now)
+        action = self.decide(now, temp, speed)
+        self.apply(self.targets())
+        self.log(now, temp, speed, action)
+        return action
+
+    def release(self):
+        """ Gives the encoders every CPU back and continues the ones it stopped."""
+
+        self.cpus = len(self.all_cpus)
+        self.paused = False
+        self.apply(list(self.managed | self.stopped))
+
+
+class StallWatchdog:
+    """ Posts webhook alerts when the encode stalls, slows down or stops while a backlog remains, and when it recovers."""
+
+    log_path = "/home/plex/h265/watchdog.log"
+    roots = ['/Storage/Television/', '/Storage/Movies/']
+    interval = 5
+    baseline_size = 500
+    baseline_min = 30
+    slow_factor = 0.5
+    debounce = 900
+    timeout = 10
+
+    def __init__(self, url, collector, stall_seconds=120, slow_seconds=300, idle_seconds=900, source=None, paused=None, log_path=None):
+        """ Initializes the StallWatchdog Object."""
+
+        self.url = url
+        self.collector = collector
+        self.holds = {'stall' : stall_seconds, 'slow' : slow_seconds, 'idle' : idle_seconds}
+        self.source = (lambda: '') if source is None else source
+        self.paused = (lambda: False) if paused is None else paused
+        if log_path is not None:
+            self.log_path = log_path
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.speeds = collections.deque(maxlen=self.baseline_size)
+        self.position = None
+        self.rate = None
+        self.moved = None
+        self.backlog = None
+        self.since = {}
+        self.alerted = {}
+        self.last_alert = {}
+        self.last = None
+
+    def get_baseline(self):
+        """ Gets the median of the recent speed readings, or None until there are enough of them."""
+
+        if len(self.speeds) < self.baseline_min:
+            return None
+        return float(np.median(self.speeds))
+
+    def get_backlog(self):
+        """ Gets the number of x264 files left, only asked once the encoder has been gone long enough."""
+
+        return sum(len(self.collector.inventory(root)['x264']) for root in self.roots)
+
+    def check(self, now, encoding, progress):
+        """ Updates the progress tracking and gets the message of every condition that currently holds."""
+
+        if not encoding or self.moved is None:
+            self.moved = now
+            self.rate = None
+        if progress is not None and progress[0] != self.position:
+            # ffmpeg's own speed is averaged since the start, so a late slowdown would hardly move it
+            if self.position is not None and progress[0] > self.position and now > self.moved:
+                self.rate = (progress[0] - self.position) / 1000 / (now - self.moved)
+                # readings taken while slow would drag the baseline down to the slow speed
+                if 'slow' not in self.since:
+                    self.speeds.append(self.rate)
+            else:
+                self.rate = None
+            self.position = progress[0]
+            self.moved = now
+
+        conditions = {}
+        if encoding and now - self.moved > 0:
+            conditions['stall'] = "no encode progress for {:.0f} seconds".format(now - self.moved)
+
+        baseline = self.get_baseline()
+        if encoding and self.rate is not None and baseline and self.rate < self.slow_factor * baseline:
+            conditions['slow'] = "encode speed {:.2f}x is below {:.0%} of the {:.2f}x baseline".format(
+                self.rate, self.slow_factor, baseline
+            )
+
+        if encoding:
+            self.backlog = None
+        else:
+            conditions['idle'] = "no encode running"
+            if now - self.since.get('idle', now) >= self.holds['idle']:
+                # the walk runs once per idle period, not on every check
+                if self.backlog is None:
+                    self.backlog = self.get_backlog()
+                if self.backlog == 0:
+                    del conditions['idle']
+                    self.backlog = None
+                else:
+                    conditions['idle'] = "no encode running with {:,} x264 files left".format(self.backlog)
+        return conditions
+
+    def update(self, now, conditions, details):
+        """ Alerts on conditions held past their hold time and announces the recovery of alerted ones."""
+
+        for name, hold in self.holds.items():
+            if name in conditions:
+                self.since.setdefault(name, now)
+                # a condition that keeps flapping alerts at most once per debounce period
+                if (
+                        not self.alerted.get(name) and
+                        now - self.since[name] >= hold and
+                        now - self.last_alert.get(name, now - self.debounce) >= self.debounce
+                ):
+                    self.alerted[name] = True
+                    self.last_alert[name] = now
+                    self.send('alert', name, conditions[name], now, details)
+            elif name in self.since:
+                started = self.since.pop(name)
+                if self.alerted.pop(name, False):
+                    self.send('recovery', name, "recovered after {:.0f} seconds".format(now - started), now, details)
+
+    def send(self, event, name, message, now, details):
+        """ Queues the webhook post, so a slow endpoint never holds up the forms."""
+
+        payload = dict(details, event=event, condition=name, message=message,
+                       time=datetime.datetime.fromtimestamp(now).isoformat(timespec='seconds'))
+        return self.executor.submit(self.post, payload)
+
+    def post(self, payload):
+        """ Posts one alert to the webhook and appends the outcome to the watchdog log."""
+
+        try:
+            request = urllib.request.Request(
+                self.url, json.dumps(payload).encode('utf-8'), {'Content-Type' : 'application/json'}
+            )
+            status = urllib.request.urlopen(request, timeout=self.timeout).status
+        except Exception as e:
+            status = str(e)
+        with open(self.log_path, 'a') as log_file:
+            log_file.write("{} {} {}: {} -> {}\n".format(
+                payload['time'], payload['event'], payload['condition'], payload['message'], status
+            ))
+        return status
+
+    def step(self, now):
+        """ Checks the encode if the interval passed, returning the conditions that hold or None."""
+
+        if self.last is not None and now - self.last < self.interval:
+            return None
+        self.last = now
+
+        if self.paused():
+            # a deliberate pause is no stall, the stall clock starts again when it ends
+            self.moved = now
+            return {}
+
+        encoding = any(
+            'ffmpeg' in (p['name'] or '') and "-probesize" in (p['cmdline'] or [])
+            for p in self.collector.processes(attrs=('pid', 'name', 'cmdline'))
+        )
+        progress = self.collector.progress()
+
+        conditions = self.check(now, encoding, progress)
+        self.update(now, conditions, {
+            'source' : self.source(),
+            'position' : None if progress is None else progress[0],
+            'speed' : self.rate
+        })
+        return conditions
+
+    def close(self):
+        """ Sends what is already queued and stops."""
+
+        self.executor.shutdown(wait=True)
+
+
+class LogIngester:
+    """ Streams rotated compression logs into the encode history, each archive only once."""
+
+    ledger_path = "/home/plex/h265/ingested_logs.json"
+    chunk_size = 1024 * 1024
+    max_samples = 32
+    # finish times are estimated back from the archive's mtime, so they drift by the gaps between encodes
+    dedupe_window = 86400
+
+    input_pattern = re.compile(r"Input #\d+, .*?, from '(.*)':")
+    duration_pattern = re.compile(r"Duration: (\d+):(\d+):([\d.]+)")
+    progress_pattern = re.compile(r"size=\s*(\d+)(?:kB|KiB)\s+time=(\d+):(\d+):([\d.]+).*?speed=\s*([\d.]+)x")
+
+    def __init__(self, collector=None, ledger_path=None):
+        """ Initializes the LogIngester Object."""
+
+        self.collector = Collector() if collector is None else collector
+        if ledger_path is not None:
+            self.ledger_path = ledger_path
+        self.ledger = {}
+        self.sniffer = None
+        if os.path.exists(self.ledger_path):
+            with open(self.ledger_path) as ledger_file:
+                self.ledger = json.load(ledger_file)
+
+    def get_archives(self):
+        """ Gets the rotated copies of the live log, oldest first."""
+
+        def age(path):
+            match = re.search(r'\.(\d+)(\.gz|\.xz)?$', path)
+            return -int(match.group(1)) if match else -os.stat(path).st_mtime
+
+        archives = [
+            path for path in glob.glob(glob.escape(self.collector.log_path) + '.*')
+            if re.search(r'\.(\d+|gz|xz)$', path)
+        ]
+        return sorted(archives, key=age)
+
+    @staticmethod
+    def open_archive(path):
+        """ Opens an archive for streaming, decompressing on the fly."""
+
+        if path.endswith('.gz'):
+            return gzip.open(path, 'rb')
+        if path.endswith('.xz'):
+            return lzma.open(path, 'rb')
+        return open(path, 'rb')
+
+    def iter_lines(self, path, checksum):
+        """ Yields the lines of an archive, hashing its uncompressed bytes as it goes."""
+
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        partial = ""
+        with self.open_archive(path) as archive:
+            while True:
+                chunk = archive.read(self.chunk_size)
+                if not chunk:
+                    break
+                checksum.update(chunk)
+                # ffmpeg rewrites its progress line with carriage returns
+                lines = re.split(r'[\r\n]', partial + decoder.decode(chunk))
+                partial = lines.pop()
+                for line in lines:
+                    yield line
+        if partial:
+            yield partial
+
+    @staticmethod
+    def to_millis(hours, minutes, seconds):
+        """ Converts a parsed hh:mm:ss.ss time to milliseconds."""
+
+        return int((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000)
+
+    def get_source_size(self, source):
+        """ Gets the size of a source that is still an AVC file on disk, or 0 so the size fits leave it out."""
+
+        if self.sniffer is None:
+            self.sniffer = CodecSniffer()
+        try:
+            source_stat = os.stat(source)
+        except OSError:
+            return 0
+        if self.sniffer.classify(source, source_stat) != 'avc':
+            return 0
+        return source_stat.st_size
+
+    def finish(self, encode):
+        """ Turns the progress of one file into a history entry, if it ran to the end."""
+
+        if encode is None or not encode['samples'] or not encode['duration']:
+            return None
+        position, size, _ = encode['samples'][-1]
+        if position < 0.95 * encode['duration']:
+            return None
+
+        speeds = [sample[2] for sample in encode['samples']]
+        step = max(1, len(encode['samples']) // self.max_samples)
+        return {
+            'source' : encode['source'],
+            'source_size' : self.get_source_size(encode['source']),
+            'dest_size' : size,
+            'duration' : float(encode['duration']),
+            'speed' : sum(speeds) / len(speeds),
+            'final_speed' : speeds[-1],
+            # ffmpeg's last speed is media time over wall time, which gives the encode's wall time
+            'wall' : position / 1000 / speeds[-1] if speeds[-1] > 0 else 0,
+            'progress' : encode['samples'][::step][:self.max_samples]
+        }
+
+    def parse(self, path, checksum):
+        """ Gets the completed encodes in an archive, split at each ffmpeg input."""
+
+        entries = []
+        encode = None
+        for line in self.iter_lines(path, checksum):
+            match = self.input_pattern.search(line)
+            if match:
+                entries.append(self.finish(encode))
+                encode = {'source' : match.group(1), 'duration' : 0, 'samples' : []}
+                continue
+            if encode is None:
+                continue
+
+            match = self.duration_pattern.search(line)
+            if match and not encode['duration']:
+                encode['duration'] = self.to_millis(*match.groups())
+                continue
+
+            match = self.progress_pattern.search(line)
+            if match:
+                size, hours, minutes, seconds, speed = match.groups()
+                encode['samples'].append([self.to_millis(hours, minutes, seconds), int(size) * 1024, float(speed)])
+        entries.append(self.finish(encode))
+        entries = [entry for entry in entries if entry is not None]
+
+        # the last encode ended when the archive was last written, each earlier one a wall time before the next
+        finished = os.stat(path).st_mtime
+        for entry in reversed(entries):
+            entry['finished'] = finished
+            finished -= entry.pop('wall')
+        return entries
+
+    def is_known(self, known, entry):
+        """ Checks whether the history already holds an encode of the same source finished around the same time."""
+
+        return any(abs(finished - entry['finished']) <= self.dedupe_window for finished in known.get(entry['source'], []))
+
+    def ingest(self):
+        """ Adds the encodes of every archive not seen before to the history, returning the count."""
+
+        # live and ingested durations come from MediaInfo and ffmpeg respectively and rarely agree exactly
+        known = {}
+        for entry in self.collector.encode_history():
+            known.setdefault(entry.get('source'), []).append(entry.get('finished') or 0)
+        seen = {(entry['path'], entry['size'], entry['mtime']) for entry in self.ledger.values()}
+        added = 0
+        for path in self.get_archives():
+            archive_stat = os.stat(path)
+            if (path, archive_stat.st_size, int(archive_stat.st_mtime)) in seen:
+                continue
+
+            # the checksum covers the uncompressed bytes, so a .1 compressed into a .gz matches itself
+            checksum = hashlib.sha256()
+            entries = self.parse(path, checksum)
+            digest = checksum.hexdigest()
+            if digest not in self.ledger:
+                for entry in entries:
+                    if not self.is_known(known, entry):
+                        known.setdefault(entry['source'], []).append(entry['finished'])
+                        self.collector.record_encode(entry)
+                        added += 1
+
+            # the latest name and stat are kept so the next run skips it without reading
+            self.ledger[digest] = {
+                'path' : path,
+                'size' : archive_stat.st_size,
+                'mtime' : int(archive_stat.st_mtime),
+                'encodes' : len(entries)
+            }
+            with open(self.ledger_path + '.tmp', 'w') as ledger_file:
+                json.dump(self.ledger, ledger_file)
+            os.replace(self.ledger_path + '.tmp', self.ledger_path)
+        return added
+
+
+class DuplicateDetector:
+    """ Finds x264 copies left next to their x265 encode, and byte identical files anywhere in the library."""
+
+    roots = ['/Storage/Television/', '/Storage/Movies/']
+    sample_size = 64 * 1024
+    chunk_size = 8 * 1024 * 1024
+    # an x265 copy this much smaller than its x264 twin is likely an encode cut short
+    suspect_ratio = 0.1
+
+    episode_pattern = re.compile(r'\bs(\d{1,2})\s*e(\d{1,3})\b', re.IGNORECASE)
+
+    def __init__(self, collector=None):
+        """ Initializes the DuplicateDetector Object."""
+
+        self.collector = Collector() if collector is None else collector
+
+    @classmethod
+    def get_key(cls, path):
+        """ Gets a file's directory and its season/episode, or its title stripped of codec and resolution tags."""
+
+        directory, title = Analytics.get_title(path)
+        episode = cls.episode_pattern.search(title)
+        if episode:
+            return (directory, "s{:02d}e{:02d}".format(int(episode.group(1)), int(episode.group(2))))
+        title = Analytics.resolution_pattern.sub(' ', title)
+        return (directory, " ".join(re.sub(r'[\W_]+', ' ', title).split()))
+
+    def get_pairs(self, avc_files, hevc_files):
+        """ Gets the x264 files whose x265 encode sits in the same folder."""
+
+        hevc_keys = {}
+        for item in hevc_files:
+            hevc_keys.setdefault(self.get_key(item['path']), []).append(item)
+
+        pairs = []
+        for item in avc_files:
+            for hevc in hevc_keys.get(self.get_key(item['path']), []):
+                pairs.append({
+                    'avc' : item['path'],
+                    'hevc' : hevc['path'],
+                    'reclaimable' : item['size'],
+                    'suspect' : hevc['size'] < self.suspect_ratio * item['size']
+                })
+                break
+        return pairs
+
+    @classmethod
+    def sample_hash(cls, path):
+        """ Hashes the head, middle and tail blocks of a file through a read only mapping."""
+
+        checksum = hashlib.sha256()
+        with open(path, 'rb') as media_file:
+            with mmap.mmap(media_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                size = len(mapped)
+                for offset in (0, max(0, size // 2 - cls.sample_size // 2), max(0, size - cls.sample_size)):
+                    checksum.update(mapped[offset:offset + cls.sample_size])
+        return checksum.hexdigest()
+
+    @classmethod
+    def full_hash(cls, path):
+        """ Hashes a whole file through a read only mapping."""
+
+        checksum = hashlib.sha256()
+        with open(path, 'rb') as media_file:
+            with mmap.mmap(media_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, 'madvise'):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                for offset in range(0, len(mapped), cls.chunk_size):
+                    checksum.update(mapped[offset:offset + cls.chunk_size])
+        return checksum.hexdigest()
+
+    @staticmethod
+    def get_buckets(files, key):
+        """ Groups the files by a key, keeping only groups of two or more."""
+
+        buckets = {}
+        for item in files:
+            try:
+                buckets.setdefault(key(item), []).append(item)
+            except OSError:
+                pass
+        return [bucket for bucket in buckets.values() if len(bucket) > 1]
+
+    def get_identical(self, files):
+        """ Gets the groups of byte identical files, narrowing by size, then sampled blocks, then full hashes."""
+
+        groups = []
+        for by_size in self.get_buckets(files, lambda item: item['size']):
+            for by_sample in self.get_buckets(by_size, lambda item: self.sample_hash(item['path'])):
+                for identical in self.get_buckets(by_sample, lambda item: self.full_hash(item['path'])):
+                    groups.append({
+                        'paths' : sorted(item['path'] for item in identical),
+                        'size' : identical[0]['size'],
+                        'reclaimable' : identical[0]['size'] * (len(identical) - 1)
+                    })
+        return groups
+
+    def detect(self):
+        """ Gets the x264/x265 pairs and the identical groups across every root."""
+
+        avc_files = []
+        hevc_files = []
+        for root in self.roots:
+            inventory = self.collector.inventory(root)
+            avc_files += inventory['x264']
+            hevc_files += inventory['x265']
+
+        return self.get_pairs(avc_files, hevc_files), self.get_identical(avc_files + hevc_files)
+
+    @staticmethod
+    def report(pairs, identical):
+        """ Describes the duplicates and the bytes deleting them would reclaim."""
+
+        lines = ["{:>18}  {}".format('RECLAIMABLE', 'DUPLICATE')]
+        for pair in sorted(pairs, key=lambda x: -x['reclaimable']):
+            lines.append("{:>18,}  {}{}".format(
+                pair['reclaimable'],
+                pair['avc'],
+                "  (x265 copy looks truncated: {})".format(pair['hevc']) if pair['suspect'] else ""
+            ))
+        for group in sorted(identical, key=lambda x: -x['reclaimable']):
+            lines.append("{:>18,}  identical: {}".format(group['reclaimable'], ", ".join(group['paths'])))
+
+        safe = sum(pair['reclaimable'] for pair in pairs if not pair['suspect'])
+        lines.append("{} x264/x265 pairs, {:,} bytes reclaimable ({:,} with a sound x265 copy)".format(
+            len(pairs), sum(pair['reclaimable'] for pair in pairs), safe
+        ))
+        lines.append("{} identical groups, {:,} bytes reclaimable".format(
+            len(identical), sum(group['reclaimable'] for group in identical)
+        ))
+        return "\n".join(lines)
+
+
+class PagePrefetcher:
+    """ Warms the page cache with the head of the next source near the end of the current encode."""
+
+    roots = ['/Storage/Television/', '/Storage/Movies/']
+    # the chunks are read into one reused buffer, only the page cache keeps them
+    chunk_size = 2 * 1024 * 1024
+    memory_share = 0.25
+    residency_interval = 5
+    libc = None
+
+    def __init__(self, queue_path=None, rate=20, lead_seconds=600):
+        """ Initializes the PagePrefetcher Object."""
+
+        self.queue_path = queue_path
+        self.rate = rate * 1024 * 1024
+        self.lead_seconds = lead_seconds
+        self.source = None
+        self.path = None
+        self.progress = {'target' : 0, 'warmed' : 0}
+        self.ratio = None
+        self.checked = 0
+        self.thread = None
+        self.stopping = threading.Event()
+
+    @classmethod
+    def get_libc(cls):
+        """ Gets the C library with the mmap and mincore signatures set."""
+
+        if cls.libc is None:
+            libc = ctypes.CDLL(None, use_errno=True)
+            libc.mmap.restype = ctypes.c_void_p
+            libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+            libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+            libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+            cls.libc = libc
+        return cls.libc
+
+    @classmethod
+    def get_residency(cls, path, length=None):
+        """ Gets the share of the first length bytes of a file that is in the page cache."""
+
+        libc = cls.get_libc()
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size if length is None else min(length, os.fstat(fd).st_size)
+            if size == 0:
+                return 1.0
+            # mapping reads nothing, mincore only reports which pages are already cached
+            address = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+            if address is None or address == ctypes.c_void_p(-1).value:
+                raise OSError(ctypes.get_errno(), "mmap failed")
+            try:
+                pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+                vector = (ctypes.c_ubyte * pages)()
+                if libc.mincore(address, size, vector) != 0:
+                    raise OSError(ctypes.get_errno(), "mincore failed")
+                return float(np.count_nonzero(np.frombuffer(vector, dtype=np.uint8) & 1)) / pages
+            finally:
+                libc.munmap(address, size)
+        finally:
+            os.close(fd)
+
+    def predict(self, current, files):
+        """ Gets the source after the current one, from the queue file or else the backlog in path order."""
+
+        candidates = []
+        if self.queue_path and os.path.exists(self.queue_path):
+            with open(self.queue_path) as queue_file:
+                candidates = [line.strip() for line in queue_file if line.strip()]
+        if not candidates:
+            candidates = sorted(files())
+
+        if current in candidates:
+            index = candidates.index(current) + 1
+            candidates = candidates[index:] + candidates[:index]
+        for path in candidates:
+            if path != current and os.path.isfile(path):
+                return path
+        return None
+
+    def run(self, path, stopping, progress):
+        """ Reads the head of a file in chunks, no faster than the rate, so the page cache holds it.
+
+        The reads are real rather than read ahead hints, which the kernel may cut short or drop,
+        so the rate paces the disk and the warmed count is the bytes actually read. The counts go
+        to this run's own progress, so a run that outlived its stop never adds to the next one."""
+
+        with IOBudget.idle():
+            with open(path, 'rb', buffering=0) as source:
+                # more than a share of the free memory would only push out what was warmed first
+                target = min(
+                    os.fstat(source.fileno()).st_size, int(psutil.virtual_memory().available * self.memory_share)
+                )
+                progress['target'] = target
+                view = memoryview(bytearray(self.chunk_size))
+                started = time.monotonic()
+                warmed = 0
+                while warmed < target and not stopping.is_set():
+                    count = source.readinto(view[:min(self.chunk_size, target - warmed)])
+                    if not count:
+                        break
+                    warmed += count
+                    progress['warmed'] = warmed
+                    delay = warmed / self.rate - (time.monotonic() - started)
+                    if delay > 0:
+                        stopping.wait(delay)
+
+    def start(self, path):
+        """ Stops any earlier prefetch and starts warming a file."""
+
+        self.stop()
+        self.stopping = threading.Event()
+        self.path = path
+        self.progress = {'target' : 0, 'warmed' : 0}
+        self.ratio = None
+        self.checked = 0
+        self.thread = threading.Thread(target=self.run, args=(path, self.stopping, self.progress), daemon=True)
+        self.thread.start()
+
+    def step(self, current, time_left, files):
+        """ Starts warming the next source once the current encode has less than the lead time left."""
+
+        if time_left is None or time_left > self.lead_seconds or current == self.source:
+            return
+        self.source = current
+        path = self.predict(current, files)
+        if path is not None:
+            self.start(path)
+
+    def get_status(self):
+        """ Gets the bytes read and the share of the range still cached, rechecked every few seconds."""
+
+        if self.path is None:
+            return None
+        progress = self.progress
+        if time.monotonic() - self.checked >= self.residency_interval:
+            self.checked = time.monotonic()
+            try:
+                self.ratio = self.get_residency(self.path, progress['target'] or None)
+            except (OSError, AttributeError):
+                self.ratio = None
+        return {'path' : self.path, 'warmed' : progress['warmed'], 'ratio' : self.ratio}
+
+    def stop(self):
+        """ Stops the running prefetch."""
+
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(5)
+            self.thread = None
+
+
+class EncodeVerifier:
+    """ Checks each finished encode's x265 output against its source in the background, one worker per disk."""
+
+    ledger_path = "/home/plex/h265/verification.jsonl"
+    max_workers = 4
+    wait_timeout = 900
+    poll_interval = 15
+    duration_tolerance = 0.01
+
+    def __init__(self, ledger_path=None):
+        """ Initializes the EncodeVerifier Object."""
+
+        if ledger_path is not None:
+            self.ledger_path = ledger_path
+        self.executor = concurrent.futures.ThreadPoolExecutor(self.max_workers)
+        self.lock = threading.Lock()
+        self.disks = {}
+        self.cache = None
+        self.stopping = threading.Event()
+
+    def submit(self, encode):
+        """ Queues the verification of a finished encode."""
+
+        return self.executor.submit(self.run, encode)
+
+    def get_disk_lock(self, path):
+        """ Gets the lock that keeps a disk to one verification at a time."""
+
+        try:
+            device = os.stat(os.path.dirname(path)).st_dev
+        except OSError:
+            device = None
+        with self.lock:
+            return self.disks.setdefault(device, threading.Lock())
+
+    def find_output(self, source, started):
+        """ Waits for the x265 file that replaced a source in its folder."""
+
+        directory = os.path.dirname(source)
+        key = DuplicateDetector.get_key(source)
+        deadline = time.time() + self.wait_timeout
+        while True:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                names = []
+            for name in names:
+                path = os.path.join(directory, name)
+                if path == source or DuplicateDetector.get_key(path) != key:
+                    continue
+                try:
+                    file_stat = os.stat(path)
+                    if file_stat.st_mtime < started:
+                        continue
+                    if CodecSniffer.classify_name(path) == 'hevc' or CodecSniffer.sniff(path, file_stat.st_size) == 'hevc':
+                        return path
+                except (OSError, struct.error):
+                    continue
+            if time.time() >= deadline or self.stopping.wait(self.poll_interval):
+                return None
+
+    def get_source_audio(self, source):
+        """ Gets the number of audio streams of a source from the metadata cache, or None if it was never probed."""
+
+        if self.cache is None:
+            self.cache = MetadataCache()
+        entry = self.cache.entries.get(source)
+        if entry is None or entry.get('version') != MetadataCache.version:
+            return None
+        # a failed probe is cached too, but knows nothing of the streams
+        if 'error' in entry or 'audio' not in entry:
+            return None
+        return len(entry['audio'])
+
+    def check(self, encode, output):
+        """ Gets the problems found comparing an output to its source probe."""
+
+        problems = []
+        video = []
+        audio = 0
+        general = None
+        for track in MediaInfo.parse(output).tracks:
+            if track.track_type == 'General':
+                general = track
+            elif track.track_type == 'Video':
+                video.append(track)
+            elif track.track_type == 'Audio':
+                audio += 1
+
+        if len(video) != 1:
+            return ["{} video streams".format(len(video))]
+        track = video[0]
+
+        duration = float(track.duration or (general.duration if general else 0) or 0)
+        if abs(duration - encode['duration']) > max(2000, self.duration_tolerance * encode['duration']):
+            problems.append("duration {} of {}".format(
+                Utils.convert_millis(int(duration)), Utils.convert_millis(int(encode['duration']))
+            ))
+
+        source_audio = self.get_source_audio(encode['source'])
+        if source_audio is not None and audio != source_audio:
+            problems.append("{} audio streams of {}".format(audio, source_audio))
+
+        for field in ('height', 'width'):
+            if encode.get(field) and int(getattr(track, field) or 0) != int(encode[field]):
+                problems.append("{} {} of {}".format(field, getattr(track, field), encode[field]))
+
+        bit_rate = MetadataCache.to_int(track.bit_rate) or MetadataCache.to_int(general.overall_bit_rate if general else 0)
+        if bit_rate == 0 and duration > 0:
+            bit_rate = int(os.path.getsize(output) * 8 / (duration / 1000))
+        if bit_rate == 0:
+            problems.append("zero bitrate")
+        return problems
+
+    def run(self, encode):
+        """ Verifies one encode at idle I/O priority and appends the result to the ledger."""
+
+        try:
+            psutil.Process(threading.get_native_id()).ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (AttributeError, psutil.Error):
+            pass
+
+        output = self.find_output(encode['source'], encode['finished'] - 60)
+        if self.stopping.is_set():
+            return None
+        result = {
+            'source' : encode['source'],
+            'output' : output,
+            'verified' : time.time(),
+            'problems' : ["no x265 output found"] if output is None else []
+        }
+        if output is not None:
+            with self.get_disk_lock(output):
+                try:
+                    result['problems'] = self.check(encode, output)
+                except Exception as e:
+                    result['problems'] = ["probe failed: {}".format(e)]
+        result['ok'] = not result['problems']
+
+        with self.lock:
+            with open(self.ledger_path, 'a') as ledger_file:
+                ledger_file.write(json.dumps(result) + "\n")
+        return result
+
+    def close(self):
+        """ Stops taking encodes and abandons any still waiting for their output."""
+
+        self.stopping.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Report:
+    """ Collects the dashboard statistics once, without a terminal, for cron and scripts."""
+
+    roots = ['/Storage/Television/', '/Storage/Movies/']
+
+    def __init__(self, collector=None):
+        """ Initializes the Report Object."""
+
+        self.collector = Collector() if collector is None else collector
+
+    def get_root(self, root):
+        """ Walks a root, returning its media lists and total size."""
+
+        inventory = self.collector.inventory(root)
+        return {
+            'x264_files' : inventory['x264'],
+            'x265_files' : inventory['x265'],
+            'total_bytes' : inventory['size']
+        }
+
+    def get_device(self, part):
+        """ Gets the usage and temperature of a device."""
+
+        device = {'device' : part.device, 'mountpoint' : part.mountpoint}
+        device.update(self.collector.disk_usage(part.mountpoint))
+        try:
+            device['temp'] = int(self.collector.disk_temp(part.device))
+        except Exception:
+            device['temp'] = None
+        return device
+
+    def get_encode(self):
+        """ Gets the file being encoded and how far along it is."""
+
+        encode = {'active' : False, 'source' : '', 'duration' : 0, 'position' : 0, 'percent' : 0, 'eta' : 0, 'speed' : 0}
+        for proc in self.collector.processes(attrs=('pid', 'name', 'cmdline')):
+            if 'ffmpeg' in (proc['name'] or '') and "-probesize" in (proc['cmdline'] or []):
+                encode['active'] = True
+                for thread in self.collector.open_files(proc['pid']):
+                    path = thread[1:].strip()
+                    if "Storage" in thread and "." in thread and re.findall(r'Television|Movies', thread):
+                        if self.collector.file_size(path) is not None:
+                            encode['source'] = path
+                            for track in self.collector.media_info(path):
+                                encode['duration'] = float(track['duration'] or 0)
+
+        try:
+            progress = Media.get_progress(self.collector.last_line())
+        except OSError:
+            progress = None
+        if encode['active'] and progress is not None:
+            encode['position'], encode['speed'] = progress
+            if encode['duration'] > 0:
+                encode['percent'] = round(100 * encode['position'] / encode['duration'], 2)
+            if encode['speed'] > 0:
+                encode['eta'] = int((encode['duration'] - encode['position']) / encode['speed'] / 1000)
+        return encode
+
+    def collect(self):
+        """ Runs every collector once, walking the roots in parallel."""
+
+        partitions = self.collector.partitions()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.roots) + len(partitions)) as executor:
+            root_jobs = {root: executor.submit(self.get_root, root) for root in self.roots}
+            device_jobs = {
+                root: [executor.submit(self.get_device, p) for p in sorted(partitions, key=lambda x: x.mountpoint) if root in p.mountpoint]
+                for root in self.roots
+            }
+            encode_job = executor.submit(self.get_encode)
+
+            report = {
+                'generated' : datetime.datetime.now().isoformat(timespec='seconds'),
+                'roots' : {},
+                'devices' : [],
+                'encode' : encode_job.result()
+            }
+
+            for root in self.roots:
+                walk = root_jobs[root].result()
+                devices = [job.result() for job in device_jobs[root]]
+                x264_files = walk['x264_files']
+                x265_files = walk['x265_files']
+                analytics = Analytics(
+                    x264_files,
+                    x265_files,
+                    [entry for entry in self.collector.encode_history() if entry.get('source', '').startswith(root)]
+                )
+                target = int(walk['total_bytes'] / len(devices)) if devices else 0
+
+                for device in devices:
+                    device_files = [item for item in x264_files if item['path'].startswith(device['mountpoint'] + '/')]
+                    device['root'] = root
+                    device['target'] = target
+                    device['x264'] = len(device_files)
+                    device['x265'] = len([item for item in x265_files if item['path'].startswith(device['mountpoint'] + '/')])
+                    device['projected'] = analytics.get_projection(device['used'], device_files)
+                    report['devices'].append(device)
+
+                report['roots'][root] = {
+                    'x264' : len(x264_files),
+                    'x265' : len(x265_files),
+                    'x264_bytes' : sum(item['size'] for item in x264_files),
+                    'x265_bytes' : sum(item['size'] for item in x265_files),
+                    'avg_avc_size' : int(sum(item['size'] for item in x264_files) / len(x264_files)) if x264_files else 0,
+                    'avg_hevc_size' : int(sum(item['size'] for item in x265_files) / len(x265_files)) if x265_files else 0,
+                    'total_bytes' : walk['total_bytes'],
+                    'capacity' : sum(device['total'] for device in devices),
+                    'projected' : sum(device['projected'] for device in devices),
+                    'hevc_ratio' : round(1 - analytics.get_savings(x264_files) / sum(item['size'] for item in x264_files), 4) if x264_files else analytics.fallback_ratio
+                }
+
+        try:
+            speeds = self.collector.conversion_speeds()
+        except OSError:
+            speeds = []
+        report['speeds'] = {
+            'samples' : len(speeds),
+            'avg' : round(sum(speeds) / len(speeds), 3) if speeds else 0,
+            'min' : min(speeds) if speeds else 0,
+            'max' : max(speeds) if speeds else 0,
+            'last' : speeds[-1] if speeds else 0
+        }
+        return report
+
+    @staticmethod
+    def flatten(value, prefix=''):
+        """ Flattens nested dicts and lists into dotted key, value pairs."""
+
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            return [(prefix, value)]
+
+        rows = []
+        for key, item in items:
+            key = str(key).strip('/')
+            rows += Report.flatten(item, "{}.{}".format(prefix, key) if prefix else key)
+        return rows
+
+    @staticmethod
+    def write(report, output, fmt='json'):
+        """ Writes the report as JSON or as key,value CSV rows."""
+
+        if fmt == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(['key', 'value'])
+            writer.writerows(Report.flatten(report))
+        else:
+            json.dump(report, output, indent=2)
+            output.write("\n")
+
+
+class RadarrIndex:
+    """ Streams the Radarr movie list, keeping only the fields the forms display."""
+
+    fields = [
+        'title', 'year', 'genres', 'runtime', 'imdbId', 'overview', 'studio',
+        'status', 'inCinemas', 'physicalRelease', 'website', 'path'
+    ]
+    chunk_size = 64 * 1024
+
+    @classmethod
+    def iter_array(cls, stream):
+        """ Yields the elements of a top level JSON array one at a time from a binary stream."""
+
+        decoder = json.JSONDecoder()
+        text = codecs.getincrementaldecoder('utf-8')()
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+
+        while True:
+            # skip the whitespace and separators between elements
+            while position < len(buffer) and buffer[position] in ' \t\r\n,' + ('' if started else '['):
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+
+            if position < len(buffer) and buffer[position] == ']':
+                return
+
+            if position < len(buffer):
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    if eof:
+                        raise
+                else:
+                    # a number cut off by the end of a chunk decodes too, so only a delimiter ends it
+                    follow = end
+                    while follow < len(buffer) and buffer[follow] in ' \t\r\n':
+                        follow += 1
+                    if eof or (follow < len(buffer) and buffer[follow] in ',]'):
+                        yield element
+                        buffer = buffer[end:]
+                        position = 0
+                        continue
+            elif eof:
+                return
+
+            chunk = stream.read(cls.chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + text.decode(chunk, final=eof)
+            position = 0
+
+    @classmethod
+    def compact(cls, movie):
+        """ Gets the displayed fields of a movie, its poster url and its file name."""
+
+        entry = {field: movie[field] for field in cls.fields if field in movie}
+        entry['posters'] = [
+            image['url'] for image in movie.get('images', []) if image.get('coverType') == 'poster'
+        ]
+        entry['relativePath'] = (movie.get('movieFile') or {}).get('relativePath', '')
+        return entry
+
+    @classmethod
+    def find(cls, stream, relative_path):
+        """ Gets the compact entry of the movie with the specified file, or None."""
+
+        for movie in cls.iter_array(stream):
+            if (movie.get('movieFile') or {}).get('relativePath') == relative_path:
+                return cls.compact(movie)
+        return None
+
+
+class ReplayFinished(Exception):
+    """ Raised when a replayed recording runs out of frames."""
+
+
+class SnapshotRecorder:
+    """ Appends every collected snapshot to a compressed recording."""
+
+    def __init__(self, path):
+        """ Initializes the SnapshotRecorder Object."""
+
+        self.handle = gzip.open(path, 'at', encoding='utf-8')
+        self.previous = {}
+
+    def write(self, kind, key, value=None, error=None):
+        """ Writes one collected value, or the error raised while collecting it."""
+
+        record = '{{"t":{:.3f},"k":{},"a":{}'.format(time.time(), json.dumps(kind), json.dumps(str(key)))
+        if error is not None:
+            record += ',"e":{}}}'.format(json.dumps(error))
+        else:
+            encoded = json.dumps(value, separators=(',', ':'))
+            if self.previous.get((kind, str(key))) == encoded:
+                record += ',"r":1}'
+            else:
+                self.previous[(kind, str(key))] = encoded
+                record += ',"v":{}}}'.format(encoded)
+
+        self.handle.write(record + "\n")
+
+    def frame(self):
+        """ Marks the start of a new frame and flushes the previous one to disk."""
+
+        self.handle.write('{{"t":{:.3f},"k":"frame"}}\n'.format(time.time()))
+        self.handle.flush()
+
+    def close(self):
+        """ Closes the recording."""
+
+        self.handle.close()
+
+
+class SnapshotPlayer:
+    """ Reads the frames back out of a recording."""
+
+    def __init__(self, path):
+        """ Initializes the SnapshotPlayer Object."""
+
+        self.handle = gzip.open(path, 'rt', encoding='utf-8')
+
+    def frames(self):
+        """ Yields the timestamp and the queued records of each recorded frame."""
+
+        timestamp = None
+        records = {}
+        try:
+            for line in self.handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the recorder was killed half way through a line
+                    break
+
+                if record['k'] == 'frame':
+                    if timestamp is not None:
+                        yield timestamp, records
+                    timestamp = record['t']
+                    records = {}
+                else:
+                    records.setdefault((record['k'], record['a']), collections.deque()).append(record)
+        except EOFError:
+            # the last gzip member was never closed
+            pass
+
+        if timestamp is not None:
+            yield timestamp, records
+
+    def close(self):
+        """ Closes the recording."""
+
+        self.handle.close()
+
+
+Partition = collections.namedtuple('Partition', ['device', 'mountpoint'])
+
+
+class TickSnapshot:
+    """ The measurements already taken in the current frame, reused from frame to frame."""
+
+    __slots__ = ('frame', 'values', 'errors')
+
+    def __init__(self):
+        """ Initializes the TickSnapshot Object."""
+
+        self.frame = 0
+        self.values = {}
+        self.errors = {}
+
+    def reset(self):
+        """ Forgets the measurements of the previous frame."""
+
+        self.frame += 1
+        self.values.clear()
+        self.errors.clear()
+
+
+class Collector:
+    """ Gathers the live system data used by the forms, optionally recording it."""
+
+    log_path = "/home/plex/h265/mediaCompression.nohup.out"
+    history_path = "/home/plex/h265/encode_history.jsonl"
+    transcoder_path = "/Storage/Misc/tmp/transcoder/"
+    radarr_url = "http://192.168.1.20:7878"
+    radarr_key = "d104c6f578054520841c3e6616aba771"
+    # extent maps are collected at this many cells and summed down to the size of the form
+    extent_cells = 3000
+
+    def __init__(self, recorder=None):
+        """ Initializes the Collector Object."""
+
+        self.recorder = recorder
+        self.log_offset = 0
+        self.log_partial = ""
+        self.log_last = ""
+        self.log_speeds = []
+        self.wakeup = None
+        self.resized = False
+        self.known_pids = None
+        self.ffmpeg_pids = set()
+        self.probed_log_size = None
+        self.radarr_movies = {}
+        self.output_fd = None
+        self.output_path = None
+        self.metadata = None
+        self.metadata_mtime = None
+        self.snapshot = TickSnapshot()
+
+    def _collect(self, kind, key, func, default=None, repeat=True, memo=True):
+        """ Runs a single collection at most once per frame, recording the result if requested."""
+
+        snapshot_key = (kind, key)
+        if memo:
+            if snapshot_key in self.snapshot.values:
+                return self.snapshot.values[snapshot_key]
+            if snapshot_key in self.snapshot.errors:
+                raise self.snapshot.errors[snapshot_key]
+
+        try:
+            value = func()
+        except Exception as e:
+            if memo:
+                self.snapshot.errors[snapshot_key] = e
+            if self.recorder:
+                self.recorder.write(kind, key, error=str(e))
+            raise
+
+        if memo:
+            self.snapshot.values[snapshot_key] = value
+        if self.recorder:
+            self.recorder.write(kind, key, value)
+        return value
+
+    def tick(self):
+        """ Starts a new frame."""
+
+        self.snapshot.reset()
+        if self.recorder:
+            self.recorder.frame()
+
+    def sleep(self, seconds):
+        """ Waits between frames."""
+
+        time.sleep(seconds)
+
+    def now(self):
+        """ Gets the time of the current frame."""
+
+        return time.time()
+
+    def _on_resize(self, signum, frame):
+        """ Flags a terminal resize, the wakeup fd interrupts any pending wait."""
+
+        self.resized = True
+
+    def _probe(self):
+        """ Checks the cheap event sources, returning the events seen since the last probe."""
+
+        events = set()
+        if self.resized:
+            self.resized = False
+            events.add('resize')
+
+        try:
+            log_size = os.stat(self.log_path).st_size
+        except OSError:
+            log_size = 0
+        if self.probed_log_size is not None and log_size != self.probed_log_size:
+            events.add('log')
+        self.probed_log_size = log_size
+
+        pids = set(psutil.pids())
+        for pid in pids - (self.known_pids or set()):
+            try:
+                if 'ffmpeg' in psutil.Process(pid).name():
+                    self.ffmpeg_pids.add(pid)
+                    if self.known_pids is not None:
+                        events.add('encoder')
+            except psutil.Error:
+                pass
+        if self.ffmpeg_pids - pids:
+            self.ffmpeg_pids &= pids
+            events.add('encoder')
+        self.known_pids = pids
+
+        return events
+
+    def wait_for_events(self, timeout, probe_interval):
+        """ Waits up to timeout seconds, returning early on a resize, new log bytes or an ffmpeg process starting or exiting."""
+
+        if self.wakeup is None:
+            self.wakeup = os.pipe()
+            os.set_blocking(self.wakeup[0], False)
+            os.set_blocking(self.wakeup[1], False)
+            signal.set_wakeup_fd(self.wakeup[1])
+            signal.signal(signal.SIGWINCH, self._on_resize)
+            self._probe()
+
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return {'timeout'}
+
+            readable, _, _ = select.select([self.wakeup[0]], [], [], min(probe_interval, remaining))
+            if readable:
+                try:
+                    os.read(self.wakeup[0], 512)
+                except OSError:
+                    pass
+
+            events = self._probe()
+            if events:
+                return events
+
+    def events(self, pending):
+        """ Gets the events that started the current frame."""
+
+        return set(self._collect('events', '', lambda: sorted(pending), [], memo=False))
+
+    def close(self):
+        """ Releases the recording, if any."""
+
+        if self.output_fd is not None:
+            os.close(self.output_fd)
+            self.output_fd = None
+        if self.recorder:
+            self.recorder.close()
+
+    def processes(self, attrs=('pid', 'name', 'memory_percent', 'cpu_percent', 'cmdline')):
+        """ Gets the requested attributes of the running processes."""
+
+        def read():
+            return [proc.info for proc in psutil.process_iter(attrs=list(attrs))]
+
+        return self._collect('processes', ",".join(attrs), read, [])
+
+    def open_files(self, pid):
+        """ Gets the lsof name lines for the specified process."""
+
+        def read():
+            return subprocess.check_output(
+                [
+                    'lsof',
+                    '-e', '/run/user/1000/doc',
+                    '-e', '/run/user/1000/gvfs',
+                    '-Fn',
+                    '-p',
+                    str(pid),
+                    '-n'
+                ],
+                stderr=None
+            ).decode('ascii').split("\n")
+
+        return self._collect('lsof', pid, read, [])
+
+    def file_size(self, path):
+        """ Gets the size of a file, or None if it is not a file."""
+
+        def read():
+            if os.path.isfile(path):
+                return os.path.getsize(path)
+            return None
+
+        return self._collect('size', path, read)
+
+    def media_info(self, path):
+        """ Gets the video tracks of a media file."""
+
+        def read():
+            tracks = []
+            for track in MediaInfo.parse(path).tracks:
+                if track.track_type == 'Video':
+                    tracks.append({
+                        'duration' : track.duration,
+                        'height' : track.height,
+                        'width' : track.width,
+                        'frame_rate' : track.frame_rate,
+                        'bit_rate' : track.bit_rate
+                    })
+            return tracks
+
+        return self._collect('mediainfo', path, read, [])
+
+    def transcoder_entries(self):
+        """ Gets the paths in the transcoder temp folder and whether each is a file."""
+
+        def read():
+            return [[str(f), f.is_file()] for f in Path(self.transcoder_path).glob('**/*')]
+
+        return self._collect('transcoder', self.transcoder_path, read, [])
+
+    def output_size(self, path):
+        """ Gets the size of the growing encode output with fstat on a descriptor kept open across calls."""
+
+        def read():
+            if self.output_fd is not None and (
+                    self.output_path != path or os.fstat(self.output_fd).st_nlink == 0
+            ):
+                # another output, or the same name reused by the next encode
+                os.close(self.output_fd)
+                self.output_fd = None
+            if self.output_fd is None:
+                self.output_fd = os.open(path, os.O_RDONLY)
+                self.output_path = path
+            return os.fstat(self.output_fd).st_size
+
+        return self._collect('output_size', path, read)
+
+    def media_files(self, path, hevc=False):
+        """ Gets the x264 or x265 media files on the specified path."""
+
+        def read():
+            if hevc:
+                return Media.get_x265_count(path)
+            return Media.get_x264_count(path)
+
+        return self._collect('x265' if hevc else 'x264', path, read, [])
+
+    def inventory(self, path):
+        """ Gets the total size and media files below the specified path, per mountpoint and merged."""
+
+        def read():
+            return DeviceWalker(self.partitions()).walk(path)
+
+        return self._collect('inventory', path, read, {'size' : 0, 'x264' : [], 'x265' : [], 'mounts' : {}})
+
+    def offenders(self, path, count):
+        """ Gets the series or movie folders below the specified path with the most x264 bytes left."""
+
+        def read():
+            self.inventory(path)
+            mounts = [p.mountpoint for p in self.partitions() if path in p.mountpoint]
+            return Media.get_tree_cache().get_offenders(mounts + [path], count)
+
+        return self._collect('offenders', path, read, [])
+
+    def tree_files(self, path):
+        """ Gets every file below the specified path."""
+
+        def read():
+            cache = Media.get_tree_cache()
+            with Media.budget.idle():
+                cache.refresh(path)
+            return cache.get_files(path)
+
+        return self._collect('tree', path, read, [])
+
+    def tree_size(self, path):
+        """ Gets the total size of every file below the specified path."""
+
+        def read():
+            cache = Media.get_tree_cache()
+            with Media.budget.idle():
+                cache.refresh(path)
+            return cache.get_total(path)['bytes']
+
+        return self._collect('treesize', path, read, 0)
+
+    def partitions(self):
+        """ Gets all mounted partitions."""
+
+        def read():
+            return [[p.device, p.mountpoint] for p in psutil.disk_partitions()]
+
+        return [Partition(*p) for p in self._collect('partitions', '', read, [])]
+
+    def disk_usage(self, mountpoint):
+        """ Gets the usage of the specified mountpoint."""
+
+        def read():
+            usage = psutil.disk_usage(mountpoint)
+            return {
+                'total' : usage.total,
+                'used' : usage.used,
+                'free' : usage.free,
+                'percent' : usage.percent
+            }
+
+        return self._collect('usage', mountpoint, read, {'total' : 1, 'used' : 0, 'free' : 0, 'percent' : 0})
+
+    def disk_temp(self, device):
+        """ Gets the temperature of the specified drive."""
+
+        def read():
+            return subprocess.check_output(['hddtemp', '--numeric', device]).decode('ascii').strip()
+
+        return self._collect('hddtemp', device, read, '0')
+
+    def cpu_temp(self):
+        """ Gets the CPU temperature."""
+
+        def read():
+            return float(psutil.sensors_temperatures()['k10temp'][0].current)
+
+        return self._collect('cputemp', '', read, 0.0)
+
+    def cpu_percent(self, interval=None):
+        """ Gets the per cpu utilization."""
+
+        def read():
+            return psutil.cpu_percent(interval=interval, percpu=True)
+
+        return self._collect('cpu', interval, read, [0.0])
+
+    def load_average(self):
+        """ Gets the 1, 5 and 15 minute load averages as a percentage of the cpu count."""
+
+        def read():
+            return [x / psutil.cpu_count() * 100 for x in psutil.getloadavg()]
+
+        return self._collect('load', '', read, [0.0, 0.0, 0.0])
+
+    def disk_io(self):
+        """ Gets the cumulative I/O counters of every block device."""
+
+        def read():
+            return {
+                name : [
+                    c.read_count, c.write_count, c.read_bytes, c.write_bytes,
+                    c.read_time, c.write_time, getattr(c, 'busy_time', 0)
+                ]
+                for name, c in (psutil.disk_io_counters(perdisk=True) or {}).items()
+            }
+
+        return self._collect('diskio', '', read, {})
+
+    def filefrag(self, path):
+        """ Gets the filefrag extent lines of the specified file."""
+
+        def read():
+            # filefrag inherits the idle I/O class and waits its turn in the scan budget
+            Media.budget.spend()
+            with Media.budget.idle():
+                return subprocess.check_output(
+                    [
+                        'filefrag',
+                        '-b512',
+                        '-e',
+                        str(path)
+                    ],
+                    stderr=None
+                ).decode('ascii').split("\n")
+
+        return self._collect('filefrag', path, read, [])
+
+    @staticmethod
+    def get_extent_cells(lines, cells):
+        """ Gets the map cells the physical extents in filefrag output fall in, a device divided into cells."""
+
+        result = []
+        for i in lines[3:-1]:
+            fields = i.split(':')
+            if len(fields) >= 3 and "Storage" not in fields[0] and fields[2] is not None:
+                try:
+                    result.append(int(int(fields[2].split('.')[0]) / 7814035087 * cells))
+                except ValueError:
+                    pass
+        return result
+
+    @staticmethod
+    def resample(counts, cells):
+        """ Sums an extent map collected at a finer resolution into fewer cells."""
+
+        result = [0] * cells
+        for index, count in enumerate(counts):
+            result[index * cells // len(counts)] += count
+        return result
+
+    def extent_map(self, mountpoint, cells):
+        """ Gets how many file extents fall in each cell of the device holding a mountpoint."""
+
+        def read():
+            counts = [0] * self.extent_cells
+            for f in self.tree_files(mountpoint):
+                if all(ord(c) < 128 for c in str(f)):
+                    for cell in self.get_extent_cells(self.filefrag(f), self.extent_cells):
+                        if 0 <= cell < self.extent_cells:
+                            counts[cell] += 1
+            return counts
+
+        # collected at one resolution, so viewers of any size find the same recorded map
+        counts = self._collect('extentmap', mountpoint, read, [0] * self.extent_cells)
+        return self.resample(counts, cells)
+
+    def file_extents(self, path, cells):
+        """ Gets the map cells holding the extents of one file."""
+
+        def read():
+            return self.get_extent_cells(self.filefrag(path), self.extent_cells)
+
+        return [cell * cells // self.extent_cells for cell in self._collect('extents', path, read, [])]
+
+    def api_get(self, url):
+        """ Gets the body of an *arr API request."""
+
+        def read():
+            return urllib.request.urlopen(urllib.request.Request(url)).read().decode('utf-8')
+
+        return self._collect('api', url, read, '{}')
+
+    def radarr_movie(self, relative_path):
+        """ Gets the compact Radarr entry of the movie with the specified file name, or None."""
+
+        def read():
+            response = urllib.request.urlopen(
+                "{}/api/movie/?apikey={}".format(self.radarr_url, self.radarr_key)
+            )
+            try:
+                return RadarrIndex.find(response, relative_path)
+            finally:
+                response.close()
+
+        # the poster and media info forms ask for the same movie on every file change
+        if relative_path in self.radarr_movies:
+            return self.radarr_movies[relative_path]
+
+        movie = self._collect('radarr', relative_path, read)
+        if movie is not None:
+            self.radarr_movies = {relative_path: movie}
+        return movie
+
+    def poster(self, url):
+        """ Downloads a poster and converts it to ansi art."""
+
+        def read():
+            urllib.request.urlretrieve(url, "/home/plex/h265/poster.jpg")
+
+            a = 0.4
+            while True:
+                ansi = subprocess.check_output([
+                    '/home/plex/.local/bin/img2txt.py',
+                    '--ansi',
+                    '--antialias',
+                    '--maxLen=42',
+                    '--targetAspect=' + str(a),
+                    '/home/plex/h265/poster.jpg'
+                ]).decode('ascii')
+                a += 0.05
+                if len(ansi.split("\n")) > 40:
+                    break
+            return ansi
+
+        return self._collect('poster', url, read, '')
+
+    def metadata_stats(self, root, avc_files, hevc_files):
+        """ Gets the cached duration and size totals of a root's x264 and x265 files."""
+
+        def read():
+            mtime = os.stat(MetadataCache.path).st_mtime if os.path.exists(MetadataCache.path) else None
+            if self.metadata is None or mtime != self.metadata_mtime:
+                self.metadata = MetadataCache()
+                self.metadata_mtime = mtime
+
+            stats = {}
+            for codec, files in (('avc', avc_files), ('hevc', hevc_files)):
+                known = []
+                for item in files:
+                    entry = self.metadata.lookup(item['path'], item['size'])
+                    if entry is not None and entry['duration'] > 0:
+                        known.append(entry)
+                stats[codec] = {
+                    'files' : len(files),
+                    'known' : len(known),
+                    'duration' : sum(entry['duration'] for entry in known) / 1000,
+                    'size' : sum(entry['size'] for entry in known)
+                }
+            return stats
+
+        return self._collect('metadata_stats', root, read, {})
+
+    def verifications(self):
+        """ Gets the number of verified encodes and the sources of those that failed."""
+
+        def read():
+            verified = 0
+            failed = []
+            if os.path.exists(EncodeVerifier.ledger_path):
+                with open(EncodeVerifier.ledger_path) as ledger_file:
+                    for line in ledger_file:
+                        try:
+                            result = json.loads(line)
+                        except ValueError:
+                            continue
+                        verified += 1
+                        if not result['ok']:
+                            failed.append(result['source'])
+            return {'verified' : verified, 'failed' : failed}
+
+        return self._collect('verifications', EncodeVerifier.ledger_path, read, {'verified' : 0, 'failed' : []})
+
+    def encode_history(self):
+        """ Gets the completed encodes recorded by record_encode."""
+
+        def read():
+            history = []
+            if os.path.exists(self.history_path):
+                with open(self.history_path) as history_file:
+                    for line in history_file:
+                        try:
+                            history.append(json.loads(line))
+                        except ValueError:
+                            pass
+            return history
+
+        return self._collect('history', self.history_path, read, [])
+
+    def record_encode(self, entry):
+        """ Appends a completed encode to the history."""
+
+        with open(self.history_path, 'a') as history_file:
+            history_file.write(json.dumps(entry) + "\n")
+        self.snapshot.values.pop(('history', self.history_path), None)
+
+    def update_log(self):
+        """ Reads any bytes appended to the nohup compression log since the last call."""
+
+        def read():
+            with open(self.log_path, 'rb') as nohup_file:
+                nohup_file.seek(0, os.SEEK_END)
+                size = nohup_file.tell()
+                reset = size < self.log_offset
+                if reset:
+                    # the log was truncated or rotated
+                    self.log_offset = 0
+                nohup_file.seek(self.log_offset)
+                data = nohup_file.read()
+                self.log_offset += len(data)
+            return {'reset' : reset, 'data' : data.decode('utf-8', 'replace')}
+
+        update = self._collect('log', self.log_path, read, {'reset' : False, 'data' : ''}, repeat=False, memo=False)
+        if update['reset']:
+            self.log_partial = ""
+            self.log_last = ""
+            self.log_speeds = []
+
+        data = update['data']
+        if data:
+            lines = (self.log_partial + data).splitlines(True)
+            self.log_partial = ""
+            if lines and not lines[-1].endswith(("\n", "\r")):
+                self.log_partial = lines.pop()
+
+            for line in lines:
+                if line.strip() != '':
+                    self.log_last = line.rstrip("\r\n") + "\n"
+                speed = re.findall(r'speed=([0-9\.]+)', line)
+                if speed:
+                    self.log_speeds.append(float(speed[0]))
+
+    def last_line(self):
+        """ Gets the last line of the nohup compression log."""
+
+        self.update_log()
+        if self.log_partial:
+            return self.log_partial
+        return self.log_last
+
+    def progress(self):
+        """ Gets the encoded position in milliseconds and the speed from the last log line, or None."""
+
+        try:
+            return Media.get_progress(self.last_line())
+        except OSError:
+            return None
+
+    def conversion_speeds(self):
+        """ Gets the speeds tracked in the nohup compression log."""
+
+        self.update_log()
+        speed = re.findall(r'speed=([0-9\.]+)', self.log_partial)
+        if speed:
+            return self.log_speeds + [float(speed[0])]
+        return list(self.log_speeds)
+
+
+class ReplayCollector(Collector):
+    """ Serves the forms from a recording instead of the live system."""
+
+    def __init__(self, path, speed=1.0):
+        """ Initializes the ReplayCollector Object."""
+
+        super().__init__()
+        self.player = SnapshotPlayer(path)
+        self.frames = self.player.frames()
+        self.speed = speed
+        self.records = {}
+        self.values = {}
+        self.started = None
+        self.frame_started = None
+        self.frame_time = 0
+        self.render_times = []
+
+    def _collect(self, kind, key, func, default=None, repeat=True, memo=True):
+        """ Returns the next recorded value instead of running the collection."""
+
+        record_key = (kind, str(key))
+        queue = self.records.get(record_key)
+        if queue:
+            record = queue.popleft()
+        elif repeat and record_key in self.values:
+            record = {'v' : self.values[record_key]}
+        else:
+            return default
+
+        if 'e' in record:
+            raise Exception(record['e'])
+        if 'v' in record:
+            self.values[record_key] = record['v']
+        return self.values.get(record_key, default)
+
+    def tick(self):
+        """ Advances to the next recorded frame, pacing it to the recording."""
+
+        now = time.time()
+        if self.frame_started is not None:
+            self.render_times.append(now - self.frame_started)
+
+        frame = next(self.frames, None)
+        if frame is None:
+            raise ReplayFinished('End of recording')
+        timestamp, self.records = frame
+        self.frame_time = timestamp
+
+        if self.started is None:
+            self.started = (now, timestamp)
+        elif self.speed > 0:
+            delay = (timestamp - self.started[1]) / self.speed - (now - self.started[0])
+            if delay > 0:
+                time.sleep(delay)
+
+        self.frame_started = time.time()
+
+    def sleep(self, seconds):
+        """ Frames are paced by tick while replaying."""
+
+        pass
+
+    def now(self):
+        """ Gets the recorded time of the current frame."""
+
+        return self.frame_time
+
+    def wait_for_events(self, timeout, probe_interval):
+        """ Frames are paced by tick while replaying, the events come from the recording."""
+
+        return set()
+
+    def record_encode(self, entry):
+        """ The history is read only while replaying."""
+
+        pass
+
+    def close(self):
+        """ Releases the recording."""
+
+        self.player.close()
+
+    def summary(self):
+        """ Describes the time spent rendering the replayed frames."""
+
+        if len(self.render_times) == 0:
+            return "Replayed 0 frames"
+
+        return "Replayed {} frames, render time avg {:.1f} ms, max {:.1f} ms, total {:.2f} s".format(
+            len(self.render_times),
+            1000 * sum(self.render_times) / len(self.render_times),
+            1000 * max(self.render_times),
+            sum(self.render_times)
+        )
+
+
+class DashboardHandler(http.server.BaseHTTPRequestHandler):
+    """ Serves the dashboard page and its stream of snapshot deltas."""
+
+    def do_GET(self):
+        """ Serves the page, or streams server sent events from /events."""
+
+        if self.path == '/':
+            body = DashboardServer.page.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if self.path != '/events':
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        messages = self.server.dashboard.subscribe()
+        try:
+            while True:
+                try:
+                    message = messages.get(timeout=15)
+                except queue.Empty:
+                    message = ": keepalive\n\n"
+                if message is None:
+                    break
+                self.wfile.write(message.encode('utf-8'))
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.server.dashboard.unsubscribe(messages)
+
+    def log_message(self, format, *args):
+        """ Requests are not logged, the terminal belongs to the forms."""
+
+        pass
+
+
+class DashboardServer:
+    """ Serves a browser view of the main panels, pushing only the values that changed to each viewer."""
+
+    backlog = 100
+    histogram_width = 120
+    page = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Media Compression</title>
+<style>
+body { background: #111; color: #ddd; font: 14px monospace; margin: 8px; }
+section { border: 1px solid #336; margin-bottom: 8px; padding: 6px; }
+h2 { color: #68f; font-size: 14px; margin: 0 0 6px 0; }
+table { border-collapse: collapse; width: 100%; }
+td, th { padding: 1px 6px; text-align: right; white-space: nowrap; }
+td:first-child, th:first-child { text-align: left; }
+.bars { display: flex; align-items: flex-end; height: 120px; gap: 1px; }
+.bars div { flex: 1; background: #4c4; min-height: 1px; }
+.avc { color: #dd4; } .hevc { color: #4d4; }
+</style>
+</head>
+<body>
+<section><h2>Summary</h2><table id="summary"></table></section>
+<section><h2>Disk Usage</h2><table id="disk_usage"></table></section>
+<section><h2>Conversion Data</h2><table id="conversions"></table></section>
+<section><h2>Speed Histogram</h2><div class="bars" id="speed_histogram"></div></section>
+<section><h2>CPU Percentage</h2><div class="bars" id="cpu_percent"></div><div id="cpu_temp"></div></section>
+<script>
+var flat = {};
+var pending = false;
+
+function unflatten() {
+  var state = {};
+  Object.keys(flat).forEach(function (key) {
+    var node = state, parts = key.split('.');
+    parts.slice(0, -1).forEach(function (part) { node = node[part] = node[part] || {}; });
+    node[parts[parts.length - 1]] = flat[key];
+  });
+  return state;
+}
+
+function values(node) {
+  return Object.keys(node || {}).sort(function (a, b) { return a - b; }).map(function (key) { return node[key]; });
+}
+
+function rows(id, header, body) {
+  var table = document.getElementById(id);
+  table.textContent = '';
+  [header].concat(body).forEach(function (row, index) {
+    var tr = table.insertRow();
+    row.forEach(function (cell) {
+      // names come from the disks, so they only ever go in as text
+      var td = document.createElement(index ? 'td' : 'th');
+      if (cell !== null && typeof cell === 'object') {
+        td.className = cell.cls;
+        td.textContent = cell.text;
+      } else {
+        td.textContent = cell;
+      }
+      tr.appendChild(td);
+    });
+  });
+}
+
+function bars(id, items, top) {
+  var node = document.getElementById(id);
+  node.textContent = '';
+  items.forEach(function (value) {
+    var bar = document.createElement('div');
+    bar.style.height = Math.min(100, 100 * value / top) + '%';
+    node.appendChild(bar);
+  });
+}
+
+function draw() {
+  pending = false;
+  var state = unflatten();
+  var roots = state.roots || {}, encode = state.encode || {}, speeds = state.speeds || {}, cpu = state.cpu || {};
+  rows('summary', ['Root', 'x264', 'x265', 'Avg AVC', 'Avg HEVC', 'HEVC Ratio', 'Projected'],
+    Object.keys(roots).map(function (root) {
+      var r = roots[root];
+      return [root, {text: r.x264, cls: 'avc'}, {text: r.x265, cls: 'hevc'},
+        r.avg_avc_size.toLocaleString(), r.avg_hevc_size.toLocaleString(), r.hevc_ratio,
+        r.capacity ? Math.round(100 * r.projected / r.capacity) + ' %' : ''];
+    }));
+  rows('disk_usage', ['Device', 'Mountpoint', 'Used', 'Free', 'Target', 'Projected', '%', 'Temp', 'x264', 'x265'],
+    values(state.devices).map(function (d) {
+      return [d.device, d.mountpoint, d.used.toLocaleString(), d.free.toLocaleString(), d.target.toLocaleString(),
+        d.projected.toLocaleString(), d.percent, d.temp === null ? '' : d.temp + 'C', d.x264, d.x265];
+    }));
+  rows('conversions', ['Source File', 'Percent', 'Speed', 'ETA'],
+    encode.active ? [[encode.source.split('/').pop(), encode.percent + ' %', encode.speed + 'x',
+      new Date(1000 * encode.eta).toISOString().substr(11, 8)]] : [['Please wait...', '', '', '']]);
+  var histogram = values(speeds.histogram);
+  bars('speed_histogram', histogram, Math.max(5, Math.max.apply(null, histogram.concat([0]))));
+  bars('cpu_percent', values(cpu.percent), 100);
+  document.getElementById('cpu_temp').textContent = 'CPU Temp ' + cpu.temp + 'C, avg speed ' + speeds.avg + 'x';
+}
+
+var source = new EventSource('events');
+source.addEventListener('snapshot', function (event) { flat = JSON.parse(event.data).set; draw(); });
+source.addEventListener('delta', function (event) {
+  var delta = JSON.parse(event.data);
+  Object.assign(flat, delta.set);
+  delta.unset.forEach(function (key) { delete flat[key]; });
+  if (!pending) { pending = true; requestAnimationFrame(draw); }
+});
+</script>
+</body>
+</html>
+"""
+
+    def __init__(self, port, host=''):
+        """ Initializes the DashboardServer Object and starts serving in the background."""
+
+        self.lock = threading.Lock()
+        self.flat = {}
+        self.version = 0
+        self.clients = set()
+        self.state = {}
+        self.server = http.server.ThreadingHTTPServer((host, port), DashboardHandler)
+        self.server.daemon_threads = True
+        self.server.dashboard = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def message(event, version, changed, removed):
+        """ Encodes a server sent event carrying changed and removed keys."""
+
+        return "event: {}\ndata: {}\n\n".format(
+            event,
+            json.dumps({'version' : version, 'set' : changed, 'unset' : removed})
+        )
+
+    def subscribe(self):
+        """ Adds a viewer, whose queue starts with the whole current state."""
+
+        messages = queue.Queue(self.backlog)
+        with self.lock:
+            messages.put(self.message('snapshot', self.version, self.flat, []))
+            self.clients.add(messages)
+        return messages
+
+    def unsubscribe(self, messages):
+        """ Drops a viewer."""
+
+        with self.lock:
+            self.clients.discard(messages)
+
+    def get_speeds(self, collector):
+        """ Gets the speed statistics and the histogram of the last speeds, 25 readings per bar."""
+
+        speeds = collector.conversion_speeds()
+        histogram = [max(speeds[i:i + 25]) for i in range(0, len(speeds), 25)][-self.histogram_width:]
+        return {
+            'samples' : len(speeds),
+            'avg' : round(sum(speeds) / len(speeds), 3) if speeds else 0,
+            'last' : speeds[-1] if speeds else 0,
+            'histogram' : histogram
+        }
+
+    def get_encode(self, cw):
+        """ Gets the file being encoded and how far along it is, as File Data last found it."""
+
+        encode = {
+            'active' : cw.current_file != "",
+            'source' : cw.current_file,
+            'duration' : float(cw.src_millis or 0) if cw.current_file else 0,
+            'position' : 0,
+            'percent' : 0,
+            'eta' : 0,
+            'speed' : 0
+        }
+        try:
+            progress = Media.get_progress(cw.collector.last_line())
+        except OSError:
+            progress = None
+        if encode['active'] and progress is not None:
+            encode['position'], encode['speed'] = progress
+            if encode['duration'] > 0:
+                encode['percent'] = round(100 * encode['position'] / encode['duration'], 2)
+            if encode['speed'] > 0:
+                encode['eta'] = int((encode['duration'] - encode['position']) / encode['speed'] / 1000)
+        return encode
+
+    def update(self, cw, rendered):
+        """ Refreshes the sections behind the rendered forms and sends what changed to every viewer.
+
+        Everything comes from what the forms computed this frame on the main thread, so a dropped
+        form leaves its section as it was rather than walking the disks again."""
+
+        collector = cw.collector
+        if 'disk_usage' in rendered:
+            self.state['roots'] = dict(cw.panels['roots'])
+            self.state['devices'] = [device for root in cw.panels['devices'] for device in cw.panels['devices'][root]]
+        if 'file_data' in rendered:
+            self.state['encode'] = self.get_encode(cw)
+        if rendered & {'speed_histogram', 'conversions', 'file_data'}:
+            self.state['speeds'] = self.get_speeds(collector)
+        if 'cpu_percent' in rendered:
+            self.state['cpu'] = {'percent' : collector.cpu_percent(), 'temp' : collector.cpu_temp()}
+
+        flat = dict(Report.flatten(self.state))
+        changed = {key : value for key, value in flat.items() if key not in self.flat or self.flat[key] != value}
+        removed = [key for key in self.flat if key not in flat]
+        if not changed and not removed:
+            return
+
+        with self.lock:
+            self.flat = flat
+            self.version += 1
+            message = self.message('delta', self.version, changed, removed)
+            for messages in list(self.clients):
+                try:
+                    messages.put_nowait(message)
+                except queue.Full:
+                    # a viewer this far behind reconnects and starts from a snapshot
+                    self.clients.discard(messages)
+                    while not messages.empty():
+                        messages.get_nowait()
+                    messages.put_nowait(None)
+
+    def close(self):
+        """ Stops serving."""
+
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotPublisher:
+    """ Publishes the latest value of every collection into a memory mapped file for viewers.
+
+    Each value carries the version it last changed in, so a viewer only decodes what changed since
+    the snapshot it read before, and many viewers cost about as much as one."""
+
+    header = struct.Struct('<4sQQQd')
+    magic = b'WMC2'
+    capacity = 16 * 1024 * 1024
+    expiry = 600
+    speed_block = 1024
+    # raw inputs of the values the forms draw, published themselves in digested form
+    excluded_kinds = {'tree', 'treesize', 'filefrag'}
+    # kept until replaced, since they are only collected when something changes
+    lasting_kinds = {'log', 'speeds', 'extentmap'}
+    # large enough for every form, so every collection a viewer may need is made
+    layout = (120, 400)
+
+    def __init__(self, path):
+        """ Initializes the SnapshotPublisher Object."""
+
+        self.path = path
+        self.version = 0
+        self.encoded = {}
+        self.forms = {}
+        self.speed_count = 0
+        self.map = None
+        self.open(self.capacity)
+
+    def open(self, capacity):
+        """ Maps a new file of the given size, replacing the published one so viewers reattach."""
+
+        fd = os.open(self.path + '.tmp', os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, capacity)
+            new_map = mmap.mmap(fd, capacity)
+        finally:
+            os.close(fd)
+        os.replace(self.path + '.tmp', self.path)
+        if self.map is not None:
+            self.map.close()
+        self.map = new_map
+
+    def put(self, key, record, now):
+        """ Stores the encoded record of a key, moving its version on only when it changed."""
+
+        data = json.dumps(record).encode('utf-8')
+        entry = self.encoded.get(key)
+        if entry is None or entry[0] != data:
+            # the snapshot about to be written gets the next even version
+            self.encoded[key] = [data, now, self.version + 2]
+        else:
+            entry[1] = now
+
+    def put_log(self, collector, now):
+        """ Stores the log state, its speeds in blocks so only the growing last block changes."""
+
+        speeds = collector.log_speeds
+        first = 0 if len(speeds) < self.speed_count else self.speed_count // self.speed_block
+        for block in range(first, (len(speeds) + self.speed_block - 1) // self.speed_block):
+            self.put(('speeds', str(block)), {'v' : speeds[block * self.speed_block:(block + 1) * self.speed_block]}, now)
+        blocks = (len(speeds) + self.speed_block - 1) // self.speed_block
+        for key in [key for key in self.encoded if key[0] == 'speeds' and int(key[1]) >= blocks]:
+            del self.encoded[key]
+        self.speed_count = len(speeds)
+
+        self.put(('log', ''), {'v' : {
+            'partial' : collector.log_partial,
+            'last' : collector.log_last,
+            'speeds' : len(speeds)
+        }}, now)
+
+    def publish(self, collector, forms, step, now):
+        """ Publishes the values collected this frame along with the last value of every older one."""
+
+        for (kind, key), value in collector.snapshot.values.items():
+            if kind not in self.excluded_kinds:
+                self.put((kind, str(key)), {'v' : value}, now)
+        for (kind, key), error in collector.snapshot.errors.items():
+            if kind not in self.excluded_kinds:
+                self.put((kind, str(key)), {'e' : str(error)}, now)
+        self.put_log(collector, now)
+        for key in [
+                key for key, (_, seen, _) in self.encoded.items()
+                if key[0] not in self.lasting_kinds and now - seen > self.expiry
+        ]:
+            del self.encoded[key]
+
+        # a viewer that skipped snapshots still learns every form drawn since the one it read
+        for form in forms:
+            self.forms[form] = self.version + 2
+
+        index = []
+        blobs = []
+        offset = 0
+        for (kind, key), (data, _, version) in self.encoded.items():
+            index.append([kind, key, version, offset, len(data)])
+            blobs.append(data)
+            offset += len(data)
+        meta = json.dumps({'time' : now, 'forms' : self.forms, 'step' : step, 'values' : index}).encode('utf-8')
+        self.write(meta, b''.join(blobs), now)
+
+    def write(self, meta, blob, now):
+        """ Writes a snapshot under an odd version while it is incomplete, so readers retry."""
+
+        length = len(meta) + len(blob)
+        if self.header.size + length > len(self.map):
+            self.open(2 * (self.header.size + length))
+
+        self.version += 1
+        self.map[:self.header.size] = self.header.pack(self.magic, self.version, 0, 0, 0)
+        start = self.header.size
+        self.map[start:start + len(meta)] = meta
+        self.map[start + len(meta):start + length] = blob
+        self.version += 1
+        self.map[:self.header.size] = self.header.pack(self.magic, self.version, len(meta), length, now)
+
+    def close(self):
+        """ Unmaps the published file, leaving the last snapshot for viewers."""
+
+        self.map.close()
+
+
+class SnapshotViewer(Collector):
+    """ Serves the forms from the snapshots a daemon publishes, without touching the system."""
+
+    def __init__(self, path):
+        """ Initializes the SnapshotViewer Object."""
+
+        Collector.__init__(self)
+        self.path = path
+        self.map = None
+        self.inode = None
+        self.version = None
+        self.values = {}
+        self.value_versions = {}
+        self.forms = set(RefreshScheduler.all_forms)
+        self.step = 0
+        self.frame_time = time.time()
+
+    def attach(self):
+        """ Maps the published file read only, again whenever the daemon replaced it."""
+
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            return False
+        if inode != self.inode:
+            if self.map is not None:
+                self.map.close()
+            with open(self.path, 'rb') as snapshot_file:
+                self.map = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.inode = inode
+            self.version = None
+            self.value_versions = {}
+        return True
+
+    def published_version(self):
+        """ Gets the version of the complete snapshot in the file, or None while it is being written."""
+
+        if not self.attach():
+            return None
+        magic, version, _, _, _ = SnapshotPublisher.header.unpack_from(self.map, 0)
+        if magic != SnapshotPublisher.magic or version == 0 or version % 2:
+            return None
+        return version
+
+    def read(self, version):
+        """ Decodes the values that changed since the last snapshot read, or None if the daemon wrote meanwhile."""
+
+        _, _, meta_length, _, _ = SnapshotPublisher.header.unpack_from(self.map, 0)
+        start = SnapshotPublisher.header.size
+        meta_bytes = self.map[start:start + meta_length]
+        if SnapshotPublisher.header.unpack_from(self.map, 0)[1] != version:
+            return None
+        meta = json.loads(meta_bytes)
+
+        values = {}
+        versions = {}
+        blob_start = start + meta_length
+        for kind, key, value_version, offset, length in meta['values']:
+            record_key = (kind, key)
+            if self.value_versions.get(record_key) == value_version:
+                values[record_key] = self.values[record_key]
+            else:
+                values[record_key] = self.map[blob_start + offset:blob_start + offset + length]
+            versions[record_key] = value_version
+        # the raw bytes are only trusted once the version shows they were not being rewritten
+        if SnapshotPublisher.header.unpack_from(self.map, 0)[1] != version:
+            return None
+        for record_key, value in values.items():
+            if isinstance(value, bytes):
+                values[record_key] = json.loads(value)
+        return meta, values, versions
+
+    def load(self):
+        """ Reads a new snapshot if one was published, returning whether it did."""
+
+        for _ in range(100):
+            version = self.published_version()
+            if version is None:
+                time.sleep(0.001)
+                continue
+            if version == self.version:
+                return False
+
+            result = self.read(version)
+            if result is None:
+                continue
+            meta, self.values, self.value_versions = result
+
+            self.forms.update(
+                form for form, drawn in meta['forms'].items() if self.version is None or drawn > self.version
+            )
+            self.version = version
+            self.step = meta['step']
+            self.frame_time = meta['time']
+
+            log = self.values.get(('log', ''), {}).get('v')
+            if log is not None:
+                self.log_partial = log['partial']
+                self.log_last = log['last']
+                blocks = (log['speeds'] + SnapshotPublisher.speed_block - 1) // SnapshotPublisher.speed_block
+                self.log_speeds = [
+                    speed for block in range(blocks)
+                    for speed in self.values.get(('speeds', str(block)), {}).get('v', [])
+                ]
+            return True
+        return False
+
+    def _collect(self, kind, key, func, default=None, repeat=True, memo=True):
+        """ Returns the published value instead of running the collection."""
+
+        record = self.values.get((kind, str(key)))
+        if record is None:
+            return default
+        if 'e' in record:
+            raise Exception(record['e'])
+        return record['v']
+
+    def tick(self):
+        """ Starts a new frame from the latest snapshot."""
+
+        self.snapshot.reset()
+        self.load()
+
+    def now(self):
+        """ Gets the time the snapshot was published."""
+
+        return self.frame_time
+
+    def _probe(self):
+        """ Checks for a resize or a new snapshot."""
+
+        events = set()
+        if self.resized:
+            self.resized = False
+            events.add('resize')
+        version = self.published_version()
+        if version is not None and version != self.version:
+            events.add('snapshot')
+        return events
+
+    def events(self, pending):
+        """ Gets the events of the frame, naming the forms the daemon refreshed since the last one."""
+
+        events = set(pending) | self.forms
+        self.forms = set()
+        return events
+
+    def update_log(self):
+        """ The log state comes with the snapshot."""
+
+        pass
+
+    def record_encode(self, entry):
+        """ Only the daemon records encodes."""
+
+        pass
+
+    def close(self):
+        """ Unmaps the published file."""
+
+        Collector.close(self)
+        if self.map is not None:
+            self.map.close()
+
+
+Rect = collections.namedtuple('Rect', ['x', 'y', 'width', 'height'])
+
+
+class Layout:
+    """ Computes the rectangle of every form for a terminal size, dropping forms that do not fit."""
+
+    disk_usage_height = 16
+    summary_height = 26
+    file_data_height = 16
+    procs_height = 17
+    media_info_height = 14
+    conversions_height = 3
+    disk_io_height = 4
+    poster_width = 43
+    poster_height = 38
+    poster_min_columns = 200
+    offenders_height = 4
+    side_width = 36
+    middle_min_width = 40
+    band_height = 22
+    band_min_height = 10
+    disk_vis_width = 76
+    histogram_min_width = 40
+
+    def __init__(self, rows, columns, cpu_count):
+        """ Initializes the Layout Object."""
+
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.forms = {}
+
+        top = 1 + self.disk_usage_height + 2
+        self.forms['disk_usage'] = Rect(1, 1, self.columns - 2, self.disk_usage_height)
+
+        self.forms['summary'] = Rect(1, top, self.side_width, self.summary_height)
+        self.forms['file_data'] = Rect(1, top + self.summary_height + 2, self.side_width, self.file_data_height)
+        band = top + self.summary_height + self.file_data_height + 4
+
+        middle_edge = self.columns
+        if self.columns >= self.poster_min_columns:
+            middle_edge = self.columns - self.poster_width - 1
+            self.forms['poster'] = Rect(middle_edge, top, self.poster_width, self.poster_height)
+            # top offenders fill what the side column leaves below the poster
+            offenders_y = top + self.poster_height + 2
+            offenders_height = max(self.offenders_height, band - offenders_y - 2)
+            self.forms['offenders'] = Rect(middle_edge, offenders_y, self.poster_width, offenders_height)
+            band = max(band, offenders_y + offenders_height + 2)
+
+        middle_x = self.side_width + 2
+        middle_width = middle_edge - middle_x - 2
+        if middle_width >= self.middle_min_width:
+            self.forms['procs'] = Rect(middle_x, top, middle_width, self.procs_height)
+            media_y = top + self.procs_height + 2
+            self.forms['media_info'] = Rect(middle_x, media_y, middle_width, self.media_info_height)
+            conversions_y = media_y + self.media_info_height + 2
+            self.forms['conversions'] = Rect(middle_x, conversions_y, middle_width, self.conversions_height)
+            disk_io_y = conversions_y + self.conversions_height + 2
+            # the disk I/O form fills what the side column leaves below the conversions
+            disk_io_height = max(self.disk_io_height, band - disk_io_y - 2)
+            self.forms['disk_io'] = Rect(middle_x, disk_io_y, middle_width, disk_io_height)
+            band = max(band, disk_io_y + disk_io_height + 2)
+
+        # the bottom band gives up rows before the whole band is dropped
+        band_height = min(self.band_height, max(self.band_min_height, self.rows - band - 4))
+        cpu_width = 2 * cpu_count + 5
+        cpu_x = self.columns - cpu_width
+        disk_vis_x = cpu_x - 2 - self.disk_vis_width + 1
+        if disk_vis_x - 2 >= self.histogram_min_width:
+            self.forms['cpu_percent'] = Rect(cpu_x, band, cpu_width, band_height)
+            self.forms['disk_visualization'] = Rect(disk_vis_x, band, self.disk_vis_width, band_height)
+            histogram_width = disk_vis_x - 2
+        elif cpu_x - 2 >= self.histogram_min_width:
+            self.forms['cpu_percent'] = Rect(cpu_x, band, cpu_width, band_height)
+            histogram_width = cpu_x - 2
+        else:
+            histogram_width = self.columns - 2
+        self.forms['speed_histogram'] = Rect(1, band, histogram_width, band_height)
+        self.forms['progress'] = Rect(1, band + band_height + 2, self.columns - 1, 1)
+
+        # anything reaching past the last row would scroll the whole frame
+        for name, rect in list(self.forms.items()):
+            if rect.y + rect.height + 1 > self.rows:
+                del self.forms[name]
+
+    def get(self, name):
+        """ Gets the rectangle of a form, or None if it was dropped."""
+
+        return self.forms.get(name)
+
+
+class RefreshScheduler:
+    """ Works out which forms are due for a redraw and how long to wait for the next one."""
+
+    active_interval = 0.5
+    idle_interval = 5
+    full_interval = 60
+    probe_interval = 0.25
+    idle_probe_interval = 1
 
-        if int(self.width) == 0:
-            self.width = len(max(self.content.split("\n"), key=len))
-        if int(self.width) > int(self.columns):
-            self.width = int(self.columns)
-            
-        if int(self.width) < len(self.name) + 10:
-            self.width = len(self.name) + 10
-        
-        if self.height == 0:
-            self.height = len(self.content.split("\n"))
-            
-        render_y = self.y
-        row_count = 0
-        output = ""
-        
-        output += self.set_cursor_position(self.y, self.x)
-        output += (
-            (
-                Style.BRIGHT +
-                Fore.BLUE +
-                chr(213) + 4*chr(205) + " {} {}" + chr(184) +
-                Style.RESET_ALL
-            ).format(
-                str(self.name),
-                (self.width  - len(self.name) - 7)*chr(205)
-            )
-        )
+    all_forms = [
+        'disk_usage', 'summary', 'procs', 'file_data', 'poster', 'offenders', 'media_info',
+        'conversions', 'disk_io', 'speed_histogram', 'disk_visualization', 'progress', 'cpu_percent'
+    ]
+    fast_forms = ['procs', 'file_data', 'disk_io', 'cpu_percent', 'progress']
+    log_forms = ['conversions', 'speed_histogram']
+    file_forms = ['poster', 'media_info', 'conversions', 'disk_visualization']
 
-        render_y += 1
-        row_count += 1
-        for line in self.content.split("\n"):
-            if row_count <= self.height:
-                output += self.set_cursor_position(render_y, self.x)
-                output += " "*(self.width+1)
-                
-                output += self.set_cursor_position(render_y, self.x)
-                if line.strip() == '_':
-                    output += (
-                        (
-                            Style.BRIGHT + Fore.BLUE + chr(179) +
-                            Style.RESET_ALL + "{:<{width}}" +
-                            # Style.BRIGHT + Fore.BLUE + chr(179) +
-                            Style.RESET_ALL + "\n"
-                        ).format(
-                            " ",
-                            width=self.width
-                        )
-                    )
-                    render_y += 1
-                    row_count += 1
-                    
-                elif line.strip() != '':
-                    output += (
-                        (
-                            Style.BRIGHT + Fore.BLUE + chr(179) +
-                            Style.RESET_ALL + "{:<{width}}" +
-                            # Style.BRIGHT + Fore.BLUE + chr(179) +
-                            Style.RESET_ALL + "\n"
-                        ).format(
-                            line,
-                            width=self.width
-                        )
-                    )
+    def __init__(self, timed=True):
+        """ Initializes the RefreshScheduler Object."""
 
-                    render_y += 1
-                    row_count += 1
+        self.timed = timed
+        self.last_fast = None
+        self.last_full = None
 
-        while row_count <= self.height:
-            output += self.set_cursor_position(render_y, self.x)
-            output += (
-                (
-                    Style.BRIGHT + Fore.BLUE + chr(179) + "{}" + Style.RESET_ALL
-                ).format((self.width)*" ")
-            )
-            render_y += 1
-            row_count += 1
+    def fast_interval(self, active):
+        """ Gets the fast form interval, shorter while an encode is running."""
 
-        output += self.set_cursor_position(render_y, self.x)
-        output += (Style.BRIGHT + Fore.BLUE + chr(192) + "{}" + chr(217) + Style.RESET_ALL).format((self.width-1)*chr(196))
-        render_y += 1
-        row_count += 1
+        return self.active_interval if active else self.idle_interval
 
-        print(output)
-        return render_y
+    def due(self, events, now, active):
+        """ Gets the forms that need redrawing for the given events."""
 
+        due = set()
+        if 'resize' in events or self.last_full is None or (self.timed and now - self.last_full >= self.full_interval):
+            self.last_full = now
+            due.update(self.all_forms)
 
-class Media:
-    """ Object that handles media file information."""
+        if 'encoder' in events or self.last_fast is None or (self.timed and now - self.last_fast >= self.fast_interval(active)):
+            self.last_fast = now
+            due.update(self.fast_forms)
 
-    @staticmethod
-    def get_x264_count(path):
-        """ Gets the count of x264 media files on the specified path."""
+        if 'log' in events:
+            due.update(self.log_forms)
 
-        file_list = []
-        for d_name, sd_name, f_list in os.walk(path):
-            for file_name in f_list:
-                if(
-                        not fnmatch.fnmatch(file_name, '*265*') and
-                        not fnmatch.fnmatch(file_name, '*HEVC*')
-                ):
-                    if os.path.exists( os.path.join(d_name, file_name) ):
-                        size = os.stat(os.path.join(d_name, file_name)).st_size
-                    else:
-                        size = 0
-                        
-                    if size > 200000000:
-                        file_list.append(
-                            {
-                                "path" : os.path.join(d_name, file_name),
-                                "size" : size
-                            }
-                        )
-        return file_list
+        # events may also name forms directly, as a daemon's snapshot does
+        due.update(events & set(self.all_forms))
+        return due
 
-    @staticmethod
-    def get_x265_count(path):
-        """ Gets the count of x265 media files on the specified path."""
+    def timeout(self, now, active):
+        """ Gets the seconds until the next timed redraw."""
 
-        file_list = []
-        for d_name, sd_name, f_list in os.walk(path):
-            for file_name in f_list:
-                if fnmatch.fnmatch(file_name, '*265*') or fnmatch.fnmatch(file_name, '*HEVC*'):
-                    if os.path.exists( os.path.join(d_name, file_name) ):
-                        size = os.stat(os.path.join(d_name, file_name)).st_size
-                    else:
-                        size = 0
-                        
-                    if size > 200000000:
-                        file_list.append(
-                            {
-                                "path" : os.path.join(d_name, file_name),
-                                "size" : size
-                            }
-                        )
-        return file_list
+        return max(0, min(
+            self.last_fast + self.fast_interval(active),
+            self.last_full + self.full_interval
+        ) - now)
 
-    @staticmethod
-    def get_last_line():
-        """ Gets the last line of the nohup compression log."""
+    def step(self, now):
+        """ Gets the progress towards the next full refresh, on the 60 step scale of the meter."""
 
-        with open("/home/plex/h265/mediaCompression.nohup.out") as nohup_file:
-            lines = nohup_file.readlines()
-            if len(lines) > 0:
-                last = lines[-1]
-            else:
-                last = ""
+        return min(60, int(60 * (now - self.last_full) / self.full_interval))
 
-        return last
+    def probe(self, active):
+        """ Gets how often the event sources are checked."""
 
-    @staticmethod
-    def get_conversion_speeds():
-        """ Gets the speeds tracked in the nohup compression log."""
-        speeds = []
-        with open("/home/plex/h265/mediaCompression.nohup.out") as nohup_file:
-            for line in nohup_file:
-                line = re.findall(r'speed=([0-9\.]+)', line)
-                if line:
-                    speeds.append(float(line[0]))
+        return self.probe_interval if active else self.idle_probe_interval
 
-        return speeds
-        
-        
 
 class CompressionWatcher:
     """ Main Compression Watcher applet object."""
 
     pp = pprint.PrettyPrinter(indent=4)
-    rows, columns = os.popen('stty size', 'r').read().split()
+    rows, columns = Utils.get_terminal_size()
     pct_disk_usage = 0
     current_row = 1
     current_partition = ""
     current_file = ""
     current_dest = ""
     conversion_speeds = []
+    src_millis = 0
+    src_size = 0
+    dest_size = 0
+    dest_millis = 0
+    speed_start = 0
+    src_track = {}
 
-    def __init__(self):
+    def __init__(self, collector=None):
         """ Initializes the CompressionWatcher Object."""
 
-        pass
+        self.collector = Collector() if collector is None else collector
+        self.layout = None
+        self.projections = {}
+        self.panels = {'roots' : {}, 'devices' : {}}
+        self.output = OutputTracker()
+        self.disk_io = DiskIOTracker()
+        self.encode_model = None
+        self.verifier = None
+        self.prefetcher = None
+
+    def set_layout(self, rows, columns):
+        """ Recomputes the form rectangles for a new terminal size."""
+
+        self.rows, self.columns = rows, columns
+        Form.rows, Form.columns = rows, columns
+        self.layout = Layout(rows, columns, len(self.collector.cpu_percent()))
+
+    def render_forms(self, due, step):
+        """ Renders the due forms that fit the layout, plus the file dependent forms when the file changed."""
+
+        forms = [
+            ('disk_usage', lambda rect: self.render_disk_usage(rect, ['/Storage/Television/', '/Storage/Movies/'])),
+            ('summary', self.render_summary),
+            ('procs', self.render_procs),
+            ('file_data', self.render_file_data),
+            ('poster', self.render_poster),
+            ('offenders', self.render_offenders),
+            ('media_info', self.render_media_info),
+            ('conversions', self.render_conversions),
+            ('disk_io', self.render_disk_io),
+            ('speed_histogram', self.render_speed_histogram),
+            ('disk_visualization', self.render_disk_visualization),
+            ('progress', lambda rect: self.render_progress(rect, step, clear=False)),
+            ('cpu_percent', self.render_cpu_percent)
+        ]
 
-    def render_summary(self, start_row):
+        due = set(due)
+        rendered = set()
+        previous_file = self.current_file
+        for name, render in forms:
+            rect = self.layout.get(name)
+            # file data still runs when dropped, it tracks the current file
+            if name not in due or (rect is None and name != 'file_data'):
+                continue
+
+            render(rect)
+            rendered.add(name)
+            if name == 'file_data':
+                # scans of the encode's own disk give way to it
+                Media.budget.encode_disk = self.get_disk_name(self.current_file) if self.current_file else None
+                Media.set_hot_files([self.current_file, self.current_dest] if self.current_file else [])
+                if self.current_file != previous_file:
+                    due.update(RefreshScheduler.file_forms)
+
+        return rendered
+
+    def render_summary(self, rect):
         """ Renders the summary form."""
 
-        x264_episodes = Media.get_x264_count('/Storage/Television/')
-        x264_movies = Media.get_x264_count('/Storage/Movies/')
-        x265_episodes = Media.get_x265_count('/Storage/Television/')
-        x265_movies = Media.get_x265_count('/Storage/Movies/')
-        self.conversion_speeds = Media.get_conversion_speeds()
+        television = self.collector.inventory('/Storage/Television/')
+        movies = self.collector.inventory('/Storage/Movies/')
+        x264_episodes = television['x264']
+        x264_movies = movies['x264']
+        x265_episodes = television['x265']
+        x265_movies = movies['x265']
+        self.conversion_speeds = self.collector.conversion_speeds()
         total_speed = sum(map(float, self.conversion_speeds))
+        tel_stats = self.collector.metadata_stats('/Storage/Television/', x264_episodes, x265_episodes)
+        mov_stats = self.collector.metadata_stats('/Storage/Movies/', x264_movies, x265_movies)
+        backlog = self.get_backlog_hours([tel_stats, mov_stats], total_speed / max(len(self.conversion_speeds), 1))
+        verifications = self.collector.verifications()
 
-        summary_form = Form('Summary')
-        summary_form.x = 1
-        summary_form.y = start_row
-        summary_form.width = 36
+        summary_form = Form('Summary', *rect)
 
-        cpu_temp = float( psutil.sensors_temperatures()['k10temp'][0].current)
+        cpu_temp = self.collector.cpu_temp()
         if cpu_temp > 75 :
             cpu_temp = Style.BRIGHT + Fore.RED + str(cpu_temp) + Style.RESET_ALL
         elif cpu_temp > 70:
@@ -305,13 +4443,19 @@ x265 Total Videos     : {x265tot:<15}
 _
 Avg Tel AVC Size      : {avc_tel_avg:<15}
 Avg Tel HEVC Size     : {hevc_tel_avg:<15}
+Est Tel HEVC Ratio    : {tel_ratio:<15}
 Est Tel Utilization   : {tel_util:<15}
+Avg Tel Bitrate       : {tel_rate:<15}
 _
 Avg Movie AVC Size    : {avc_mov_avg:<15}
 Avg Movie HEVC Size   : {hevc_mov_avg:<15}
+Est Movie HEVC Ratio  : {mov_ratio:<15}
 Est Movie Utilization : {mov_util:<15}
+Avg Movie Bitrate     : {mov_rate:<15}
 _
 {white}Avg Conversion Speed  : {avg_spd:<.2f}
+{white}Backlog Encode Hours  : {backlog:<15}
+{white}Failed Verifications  : {failed:<15}
 {white}Days Until Completion : {eta:<4.4f}"""
             ).format(
                 
@@ -336,43 +4480,23 @@ _
                 hevc_tel_avg=Fore.GREEN + str( (
                     int((sum(item['size'] for item in x265_episodes)) / len(x265_episodes))
                 ) ) + Style.RESET_ALL,
-                tel_util=Style.BRIGHT + Fore.GREEN + str(
-                    str(
-                        int(
-                            (
-                                (sum(item['size'] for item in x265_episodes))
-                                /
-                                len(x265_episodes)
-                                *
-                                (len(x264_episodes) + len(x265_episodes))
-                                /
-                                len(self.get_devices('/Storage/Television/'))
-                            ) / 38446405000
-                        )
-                    ) + " %"
-                ) + Style.RESET_ALL,
+                tel_ratio=self.get_projection_ratio('/Storage/Television/'),
+                tel_util=self.get_projection_utilization('/Storage/Television/'),
+                tel_rate=self.get_bit_rates(tel_stats),
 
                 avc_mov_avg= Fore.YELLOW + str( (int((sum(item['size'] for item in x264_movies)) / (len(x264_movies) + 1) )) ) + Style.RESET_ALL,
                 hevc_mov_avg=Fore.GREEN + str(int((sum(item['size'] for item in x265_movies)) / (len(x265_movies) + 1) )) + Style.RESET_ALL,
-                mov_util=Style.BRIGHT + Fore.GREEN + str(
-                    str(
-                        int(
-                            (
-                                (sum(item['size'] for item in x265_movies))
-                                /
-                                len(x265_movies)
-                                *
-                                (len(x264_movies) + len(x265_movies))
-                                /
-                                len(self.get_devices('/Storage/Movies/'))
-                            ) / 38446405000
-                        )
-                    ) + " %"
-                ) + Style.RESET_ALL,
+                mov_ratio=self.get_projection_ratio('/Storage/Movies/'),
+                mov_util=self.get_projection_utilization('/Storage/Movies/'),
+                mov_rate=self.get_bit_rates(mov_stats),
 
                 white = Style.BRIGHT + Fore.WHITE,
                 avg_spd=total_speed/(len(self.conversion_speeds)+1),
-                eta=(
+                backlog="Please wait..." if backlog is None else "{:.0f} ({}%)".format(*backlog),
+                failed=(Fore.RED if verifications['failed'] else Fore.GREEN) + "{} of {}".format(
+                    len(verifications['failed']), verifications['verified']
+                ) + Style.RESET_ALL,
+                eta=backlog[0] / 24 if backlog is not None else (
                     (
                         len(x264_episodes)
                         +
@@ -386,58 +4510,91 @@ _
 
         return summary_form.render()
 
-    def render_file_data(self, start_row):
-        """ Renders the conversion file form. """
-        file_data_form = Form('File Data', x=1, y=start_row, width=36, height=16)
-        new_file = False
+    @staticmethod
+    def get_bit_rates(stats):
+        """ Gets the mean AVC and HEVC bitrates of a root from its probed files."""
+
+        rates = []
+        for codec, color in (('avc', Fore.YELLOW), ('hevc', Fore.GREEN)):
+            if not stats.get(codec) or stats[codec]['duration'] == 0:
+                return "Please wait..."
+            rates.append(color + "{:.1f}".format(stats[codec]['size'] * 8 / stats[codec]['duration'] / 1000000) + Style.RESET_ALL)
+        return " / ".join(rates) + " Mbps"
+
+    @staticmethod
+    def get_backlog_hours(roots, speed):
+        """ Gets the encode hours left for the x264 backlog and the percent of it that was probed."""
+
+        files = sum(stats['avc']['files'] for stats in roots if stats)
+        known = sum(stats['avc']['known'] for stats in roots if stats)
+        if known == 0 or speed <= 0:
+            return None
+
+        # files not probed yet are assumed to run as long as the probed ones
+        duration = sum(stats['avc']['duration'] for stats in roots if stats) * files / known
+        return duration / speed / 3600, int(100 * known / files)
+
+    def get_projection_ratio(self, path):
+        """ Gets the expected HEVC/AVC size ratio of a root and the number of samples behind it."""
+
+        if path not in self.projections:
+            return "Please wait..."
+
+        projection = self.projections[path]
+        return Fore.GREEN + "{:.2f} ({})".format(projection['ratio'], projection['samples']) + Style.RESET_ALL
+
+    def get_projection_utilization(self, path):
+        """ Gets the projected utilization of a root once its x264 backlog is converted."""
+
+        if path not in self.projections or self.projections[path]['total'] == 0:
+            return "Please wait..."
+
+        projection = self.projections[path]
+        return Style.BRIGHT + Fore.GREEN + "{} %".format(
+            int(100 * projection['projected'] / projection['total'])
+        ) + Style.RESET_ALL
+
+    def render_file_data(self, rect):
+        """ Renders the conversion file form, or only tracks the current file when rect is None. """
+        file_data_form = Form('File Data', *(rect or Rect(1, 1, 36, 16)))
         
         try:
             procs = [
-                p.info for p in psutil.process_iter(
-                    attrs=['pid', 'name', 'cmdline']
-                ) if 'ffmpeg' in p.info['name']
+                p for p in self.collector.processes(attrs=('pid', 'name', 'cmdline')) if 'ffmpeg' in p['name']
             ]
             
             if len(list(procs)) == 0:
+                self.finish_encode()
                 self.current_file = ""
                 file_data_form.add_content("Please wait...")
-                file_data_form.render()
-                return -1
+                return file_data_form.render() if rect else 0
                 
             for proc in procs:
                 if "-probesize" in proc['cmdline']:
                 
                     try:
-                        processes = subprocess.check_output(
-                            [
-                                'lsof', 
-                                '-e', '/run/user/1000/doc', 
-                                '-e', '/run/user/1000/gvfs', 
-                                '-Fn', 
-                                '-p', 
-                                str(proc['pid']), 
-                                '-n'
-                            ],
-                            stderr=None
-                        ).decode('ascii').split("\n")
+                        processes = self.collector.open_files(proc['pid'])
 
                         
                             
                         for thread in processes:
                             if "Storage" in thread and "." in thread:
                                 if re.findall(r'Television|Movies', thread):
-                                    if os.path.isfile( str( thread[1:]).strip() ):
+                                    src_file_size = self.collector.file_size( str( thread[1:]).strip() )
+                                    if src_file_size is not None:
                                         if str(self.current_file).strip() != str(thread[1:]).strip():
-                                            self.current_file = str(thread[1:]).strip()
-                                            new_file = True
+                                            self.finish_encode()
+                                            self.speed_start = len(self.collector.conversion_speeds())
+                                            self.encode_model = None
+                                        self.current_file = str(thread[1:]).strip()
+                                        self.src_size = src_file_size
                                             
-                                        media_info = MediaInfo.parse(str(thread)[1:])
-                                        for track in media_info.tracks:
-                                            if track.track_type == 'Video':
-                                                self.src_millis = track.duration
+                                        for track in self.collector.media_info(str(thread)[1:]):
+                                            self.src_millis = track['duration']
+                                            self.src_track = track
 
-                                                file_data_form.add_content(
-                                                    ("""Source
+                                            file_data_form.add_content(
+                                                ("""Source
 FileSize           : {src_file_size:<15,}
 Duration           : {src_duration:<15}
 Height             : {src_height:<15}
@@ -446,14 +4603,14 @@ Framerate          : {src_frame_rate:<15}
 Bitrate            : {src_bit_rate:<15}
 _
 """                                                 ).format(
-                                                        src_file_size=os.path.getsize(str(thread)[1:]),
-                                                        src_duration=(Utils.convert_millis(int(float((0 if track.duration is None else track.duration))))),
-                                                        src_height=(0 if track.height is None else track.height),
-                                                        src_width=(0 if track.width is None else track.width),
-                                                        src_frame_rate=(0 if track.frame_rate is None else track.frame_rate),
-                                                        src_bit_rate=(0 if track.bit_rate is None else track.bit_rate)
-                                                    )
+                                                    src_file_size=src_file_size,
+                                                    src_duration=(Utils.convert_millis(int(float((0 if track['duration'] is None else track['duration']))))),
+                                                    src_height=(0 if track['height'] is None else track['height']),
+                                                    src_width=(0 if track['width'] is None else track['width']),
+                                                    src_frame_rate=(0 if track['frame_rate'] is None else track['frame_rate']),
+                                                    src_bit_rate=(0 if track['bit_rate'] is None else track['bit_rate'])
                                                 )
+                                            )
                                         
                                     else:
                                         self.current_file = ""
@@ -462,50 +4619,96 @@ _
         except Exception as e:
             file_data_form.add_content( str(e) )
             
-        root_directory = Path("/Storage/Misc/tmp/transcoder/")
-        for f in root_directory.glob('**/*'):
-            if f.is_file():
+        for f, is_file in self.collector.transcoder_entries():
+            if is_file:
                 try:
-                    self.current_dest = str(f)
-                    media_info = MediaInfo.parse(f)
-                    for track in media_info.tracks:
-                        if track.track_type == 'Video':
-                            file_data_form.add_content(
-                                ("""Destination
+                    self.current_dest = f
+                    self.dest_size = self.collector.output_size(f)
+                    progress = Media.get_progress(self.collector.last_line())
+                    if progress is not None:
+                        self.output.sample(f, self.collector.now(), self.dest_size, progress[0])
+                    prediction = self.output.predict(self.src_millis, self.src_size)
+                    if self.prefetcher is not None and progress is not None and progress[1] > 0 and self.src_millis:
+                        self.prefetcher.step(
+                            self.current_file,
+                            max(float(self.src_millis) - progress[0], 0) / progress[1] / 1000,
+                            lambda: [
+                                item['path'] for root in PagePrefetcher.roots
+                                for item in self.collector.inventory(root)['x264']
+                            ]
+                        )
+
+                    file_data_form.add_content(
+                        ("""Destination
 FileSize           : {dest_file_size:<15,}
-Duration           : {dest_duration:<15}
-Height             : {dest_height:<15}
-Width              : {dest_width:<15}
-Framerate          : {dest_frame_rate:<15}
-Bitrate            : {dest_bit_rate:<15}"""
-                                ).format(
-                                    dest_file_size=os.path.getsize(f),
-                                    dest_duration=(
-                                        0 if track.duration is None else Utils.convert_millis(int(float(track.duration)))
-                                    ),
-                                    dest_height=(0 if track.height is None else track.height),
-                                    dest_width=(0 if track.width is None else track.width),
-                                    dest_frame_rate=(0 if track.frame_rate is None else track.frame_rate),
-                                    dest_bit_rate=(0 if track.bit_rate is None else track.bit_rate)
-                                )
-                            )
+Live Bitrate       : {bit_rate:<15}
+Predicted Size     : {size:<15}
+Projected Savings  : {savings:<15}
+Savings Ratio      : {ratio:<15}"""
+                        ).format(
+                            dest_file_size=self.dest_size,
+                            bit_rate="Please wait..." if prediction is None else "{:,}".format(prediction['bit_rate']),
+                            size="Please wait..." if prediction is None else "{:,}".format(prediction['size']),
+                            savings="Please wait..." if prediction is None else (
+                                Fore.GREEN + "{:,}".format(prediction['savings']) + Style.RESET_ALL
+                            ),
+                            ratio="Please wait..." if prediction is None else "{:.2f}".format(prediction['ratio'])
+                        )
+                    )
                 except Exception as e:
                     file_data_form.add_content( str(e) )
             else:
                 self.current_dest = ""
-        if new_file == True:
-            return -1 
-        else:
-            return file_data_form.render()
 
-    def render_progress(self, start_row, step, clear=False):
+        status = self.prefetcher.get_status() if self.prefetcher is not None else None
+        if status is not None:
+            file_data_form.add_content(
+                ("""
+Prefetched         : {warmed:<15,}
+Cache Resident     : {ratio:<15}"""
+                ).format(
+                    warmed=status['warmed'],
+                    ratio="Please wait..." if status['ratio'] is None else "{:.0%}".format(status['ratio'])
+                )
+            )
+        return file_data_form.render() if rect else 0
+
+    def finish_encode(self):
+        """ Records the encode of the current file in the history if it ran to the end."""
+
+        if self.current_file != "" and self.src_millis and self.dest_millis >= 0.95 * float(self.src_millis):
+            speeds = self.collector.conversion_speeds()[self.speed_start:]
+            encode = {
+                'source' : self.current_file,
+                'source_size' : self.src_size,
+                'dest_size' : self.dest_size,
+                'duration' : float(self.src_millis),
+                'height' : self.src_track.get('height'),
+                'width' : self.src_track.get('width'),
+                'frame_rate' : self.src_track.get('frame_rate'),
+                'bit_rate' : self.src_track.get('bit_rate'),
+                'speed' : sum(speeds) / len(speeds) if speeds else 0,
+                # ffmpeg reports the speed since the start, so the last one is media time over wall time
+                'final_speed' : speeds[-1] if speeds else 0,
+                'finished' : self.collector.now()
+            }
+            self.collector.record_encode(encode)
+            if self.verifier:
+                self.verifier.submit(encode)
+
+        self.src_size = 0
+        self.src_track = {}
+        self.dest_size = 0
+        self.dest_millis = 0
+
+    def render_progress(self, rect, step, clear=False):
         """Renders the progress bar."""
         
-        progress_form = Form('Full Refresh Meter', y=start_row, x=1, width=(int(self.columns) - 1))
+        progress_form = Form('Full Refresh Meter', *rect)
         if clear:
-            progress_form.add_content( " "*((int(self.columns) )))
+            progress_form.add_content( " "*rect.width)
         else:
-            bar = ( chr(219) * ( int((int(self.columns))/60*step) ) ).ljust( (int(self.columns) ) )[0: (int(self.columns) )]
+            bar = ( chr(219) * ( int(rect.width/60*step) ) ).ljust( rect.width )[0: rect.width]
             if step / 60 < .25:
                 progress_form.add_content( Fore.CYAN   + bar + Style.RESET_ALL )
             elif step / 60 < .50:
@@ -517,12 +4720,12 @@ Bitrate            : {dest_bit_rate:<15}"""
 
         render = progress_form.render()
         
-        print( progress_form.set_cursor_position(progress_form.y + 1, ( int(float(self.columns) / 2 ) ) - 2 ) + str(int(float(step/60*100))) + "%" )
+        print( progress_form.set_cursor_position(progress_form.y + 1, rect.x + int(rect.width / 2) - 2 ) + str(int(float(step/60*100))) + "%" )
         return render
 
-    def render_poster(self, start_row):
+    def render_poster(self, rect):
         """Renders an ascii art poster of the currently converting file"""
-        poster_form = Form('Poster', y=start_row, x=186, width=43, height=38)
+        poster_form = Form('Poster', *rect)
         
         try:
             if "/Television/" in self.current_file:
@@ -531,71 +4734,27 @@ Bitrate            : {dest_bit_rate:<15}"""
                     "153e4bef80f6465fa20711a0b8469f55",
                     os.path.basename(self.current_file)
                 )
-                r = urllib.request.urlopen(req_url).read()
-                data = r.decode('utf-8')
+                data = self.collector.api_get(req_url)
                 tree_obj = objectpath.Tree(json.loads(data))
                 json_details = tree_obj.execute("$..*[@.coverType is 'poster'].url")
                  
                 if json_details:
                     for entry in json_details:
-                        urllib.request.urlretrieve( entry, "/home/plex/h265/poster.jpg")
-                        
-                        a = 0.4
-                        while True:
-                            ansi = subprocess.check_output([
-                                '/home/plex/.local/bin/img2txt.py',
-                                '--ansi',
-                                '--antialias',
-                                '--maxLen=42',
-                                '--targetAspect=' + str(a),
-                                '/home/plex/h265/poster.jpg'
-                            ]).decode('ascii')
-                            a += 0.05
-                            if len(ansi.split("\n")) > 40:
-                                break
-                            
                         poster_form.add_content(
-                            ansi
+                            self.collector.poster(entry)
                         )
                     
                 else:
                     poster_form.add_content('Please Wait...')
             elif "/Movies/" in self.current_file:
-                # there is no parse for radarr, gotta load them all
-                req = urllib.request.Request("{}/api/movie/?apikey={}".format("http://192.168.1.20:7878", "d104c6f578054520841c3e6616aba771" ))
-                r = urllib.request.urlopen(req).read()
-                data = r.decode('utf-8')
-                
-                radarrObj = objectpath.Tree(json.loads(data))
-                json_details = radarrObj.execute(
-                    "$.*[@.movieFile.relativePath is \"{}\"].images".format( 
-                        os.path.basename(self.current_file)
-                    )
-                )
+                # there is no parse for radarr, the movie list is streamed for the matching file
+                movie = self.collector.radarr_movie(os.path.basename(self.current_file))
                 
-                if json_details:
-                    for entry in json_details:
-                        for img in entry:
-                            if img['coverType'] == 'poster':
-                                urllib.request.urlretrieve( "http://192.168.1.20:7878" + img['url'], "/home/plex/h265/poster.jpg")
-                                
-                                a = 0.4
-                                while True:
-                                    ansi = subprocess.check_output([
-                                        '/home/plex/.local/bin/img2txt.py',
-                                        '--ansi',
-                                        '--antialias',
-                                        '--maxLen=42',
-                                        '--targetAspect=' + str(a),
-                                        '/home/plex/h265/poster.jpg'
-                                    ]).decode('ascii')
-                                    a += 0.05
-                                    if len(ansi.split("\n")) > 40:
-                                        break
-                                    
-                                poster_form.add_content(
-                                    ansi
-                                )
+                if movie:
+                    for url in movie['posters']:
+                        poster_form.add_content(
+                            self.collector.poster(self.collector.radarr_url + url)
+                        )
                 else:
                     poster_form.add_content('Please Wait...')
             else:
@@ -605,20 +4764,19 @@ Bitrate            : {dest_bit_rate:<15}"""
         
         return poster_form.render()
     
-    def render_conversions(self, start_row):
+    def render_conversions(self, rect):
         """Renders the file conversion form."""
         
-        last_line = Media.get_last_line()
-        conversion_form = Form('Conversion Data', y=start_row, x=38, width=(int(self.columns) - 82))
-        conversion_form.add_content(Style.BRIGHT + Fore.WHITE + "Source File      " + Style.RESET_ALL + ": " + os.path.basename(self.current_file).ljust(int(self.columns) - 110)[:int(self.columns) - 110] + "\n")
+        last_line = self.collector.last_line()
+        conversion_form = Form('Conversion Data', *rect)
+        conversion_form.add_content(Style.BRIGHT + Fore.WHITE + "Source File      " + Style.RESET_ALL + ": " + os.path.basename(self.current_file).ljust(rect.width - 28)[:rect.width - 28] + "\n")
         conversion_form.add_content(Style.BRIGHT + Fore.WHITE + "Encoding Process " + Style.RESET_ALL + ": " + last_line)
         
         
-        time_match = re.search(r'([0-9]+:[0-9]+:[0-9.]+)', last_line)
-        speed_match = re.search(r'([0-9]+[.]*[0-9]*)x', last_line)
-        if time_match is not None and speed_match is not None:
-            hour, minute, second = time_match.group(0).split(':')
-            dest_millis = ( (int(hour) * 60 * 60 * 1000) + (int(minute) * 60 * 1000) + (int(float(second)) * 1000) )
+        progress = Media.get_progress(last_line)
+        if progress is not None and self.src_millis:
+            dest_millis, speed = progress
+            self.dest_millis = dest_millis
             
             pct_comp = float(round( (100* float(dest_millis) / float(self.src_millis)),2))
             pct_comp_style = ""
@@ -631,7 +4789,7 @@ Bitrate            : {dest_bit_rate:<15}"""
             else:
                 pct_comp_style = Style.BRIGHT + Fore.CYAN
             
-            time_left = int((float( self.src_millis) - float(dest_millis)) / float( speed_match.group(1) ) )
+            time_left = self.get_time_left(dest_millis, speed)
             time_left_style = ""
             if time_left > 1000 * 60 * 15:
                 time_left_style = Style.NORMAL + Fore.RED
@@ -657,8 +4815,109 @@ Bitrate            : {dest_bit_rate:<15}"""
 
         return conversion_form.render()
 
-    def render_media_info(self, start_row):
-        media_form = Form('Media Info', y=start_row, x=38, height=14, width=(int(self.columns) - 82))
+    def get_encode_model(self):
+        """ Gets the encode time model, refitted once per file since history only grows between files."""
+
+        if self.encode_model is None:
+            self.encode_model = EncodeModel(self.collector.encode_history())
+        return self.encode_model
+
+    def get_time_left(self, dest_millis, speed):
+        """ Gets the milliseconds left in the encode, moving from the model to the measured speed."""
+
+        measured = (float(self.src_millis) - float(dest_millis)) / speed if speed > 0 else None
+        predicted = self.get_encode_model().predict(dict(self.src_track, duration=self.src_millis))
+        if predicted is None:
+            return int(measured or 0)
+
+        fraction = float(dest_millis) / float(self.src_millis)
+        predicted = 1000 * predicted * max(0, 1 - fraction)
+        if measured is None:
+            return int(predicted)
+
+        # the speed reading settles over the first tenth of the file
+        weight = min(1.0, fraction / 0.1)
+        return int(weight * measured + (1 - weight) * predicted)
+
+    def get_disk_name(self, path):
+        """ Gets the physical disk holding a path, sdb for a file on /dev/sdb1, or '' when unknown."""
+
+        mounts = [p for p in self.collector.partitions() if path and (path + '/').startswith(p.mountpoint.rstrip('/') + '/')]
+        if not mounts:
+            return ''
+        part = max(mounts, key=lambda x: len(x.mountpoint))
+        return os.path.basename(DeviceWalker.get_disk(part.device))
+
+    def render_disk_io(self, rect):
+        """ Renders the per disk I/O form, highlighting the disks of the encode source and the transcoder."""
+
+        rates = self.disk_io.sample(self.collector.now(), self.collector.disk_io())
+        roles = collections.defaultdict(list)
+        source = self.get_disk_name(self.current_file) if self.current_file else None
+        if source is not None:
+            roles[source].append('SOURCE')
+        roles[self.get_disk_name(self.collector.transcoder_path)].append('TRANSCODER')
+
+        # the title says whether a slow encode is waiting on its source disk
+        title = 'Disk I/O'
+        if source in rates:
+            title += ' - source disk saturated' if rates[source]['util'] >= 90 else ' - source disk has headroom'
+        disk_io_form = Form(title, *rect)
+
+        line = "{:<9}{:>11}{:>11}{:>8}{:>10}{:>6}  {}"
+        disk_io_form.add_content(
+            Style.BRIGHT + Fore.WHITE +
+            line.format("DEVICE", "READ MB/s", "WRITE MB/s", "IOPS", "AWAIT ms", "UTIL", "") +
+            Style.RESET_ALL + "\n"
+        )
+        if not rates:
+            disk_io_form.add_content("Please wait...\n")
+            return disk_io_form.render()
+
+        # the encode's own disks first, then the busiest
+        names = sorted(rates, key=lambda name: (name not in roles, -rates[name]['util'], name))
+        for name in names[:rect.height - 1]:
+            rate = rates[name]
+            color = Style.BRIGHT + Fore.YELLOW if name in roles else Style.NORMAL + Fore.WHITE
+            if rate['util'] >= 90:
+                color = Style.BRIGHT + Fore.RED
+            disk_io_form.add_content(
+                color + line.format(
+                    name,
+                    "{:.1f}".format(rate['read'] / 1048576),
+                    "{:.1f}".format(rate['write'] / 1048576),
+                    "{:.0f}".format(rate['iops']),
+                    "{:.1f}".format(rate['await']),
+                    "{:.0f}%".format(rate['util']),
+                    "+".join(roles.get(name, []))
+                ) + Style.RESET_ALL + "\n"
+            )
+        return disk_io_form.render()
+
+    def render_offenders(self, rect):
+        """ Renders the series and movies with the most x264 bytes left to encode."""
+
+        offenders_form = Form('Top Offenders', *rect)
+        offenders = sorted(
+            [
+                item for path in ['/Storage/Television/', '/Storage/Movies/']
+                for item in self.collector.offenders(path, rect.height)
+            ],
+            key=lambda item: -item[5]
+        )[:rect.height]
+        if not offenders:
+            offenders_form.add_content("Nothing left to encode\n")
+        for name, _, _, x264, _, x264_bytes in offenders:
+            offenders_form.add_content(
+                (
+                    Style.BRIGHT + Fore.RED + "{:>7.1f}G " + Style.RESET_ALL +
+                    Fore.WHITE + "{:>4} " + Style.RESET_ALL + "{}\n"
+                ).format(x264_bytes / 1073741824, x264, name[:rect.width - 15])
+            )
+        return offenders_form.render()
+
+    def render_media_info(self, rect):
+        media_form = Form('Media Info', *rect)
         output = ""
         if "/Television/" in self.current_file:
             req_url = "{}/api/parse/?apikey={}&path=/{}".format(
@@ -666,9 +4925,7 @@ Bitrate            : {dest_bit_rate:<15}"""
                 "153e4bef80f6465fa20711a0b8469f55",
                 os.path.basename(self.current_file)
             )
-            req = urllib.request.Request(req_url)
-            r = urllib.request.urlopen(req).read()
-            data = json.loads( r.decode('utf-8') )
+            data = json.loads( self.collector.api_get(req_url) )
             if 'series' in data and 'episodes' in data and len(data['episodes']) > 0:
                 output = ("""        
 {seriesTitle} - ({seriesYear}) - Genres: {seriesGenre} - IMDB: {seriesImdb}
@@ -700,17 +4957,13 @@ _
             else:
                 media_form.add_content('Please Wait...')
         elif "/Movies/" in self.current_file:
-            # there is no parse for radarr, gotta load them all
-            req = urllib.request.Request("{}/api/movie/?apikey={}".format("http://192.168.1.20:7878", "d104c6f578054520841c3e6616aba771" ))
-            r = urllib.request.urlopen(req).read()
-            data = r.decode('utf-8')
-            radarrObj = objectpath.Tree(json.loads(data))
-            json_details = radarrObj.execute("$..*[@.movieFile.relativePath is \"{}\"]".format( os.path.basename(self.current_file) ))
+            # there is no parse for radarr, the movie list is streamed for the matching file
+            movie = self.collector.radarr_movie(os.path.basename(self.current_file))
          
-            if json_details:
-                for data in json_details:
-                    try: 
-                        output = ("""        
+            if movie:
+                data = movie
+                try: 
+                    output = ("""        
 {movieTitle} - ({movieYear}) - Genres: {movieGenre} - Runtime: {movieRuntime} - IMDB: {movieIMDB}
 {movieOverview}
 _
@@ -720,21 +4973,21 @@ _
 Website: {movieWebsite}
 Path: {moviePath}
 """                     ).format(
-                            movieStatus = Style.BRIGHT + Fore.WHITE + str(data['status']) + Style.RESET_ALL,
-                            movieInCinemas = Style.BRIGHT + Fore.GREEN + str(data['inCinemas'][:10]) + Style.RESET_ALL,
-                            moviePhysicalRelease = Style.BRIGHT + Fore.BLUE + (str(data['physicalRelease'] if 'physicalRelease' in data else '')[:10]) + Style.RESET_ALL,
-                            movieIMDB = Style.BRIGHT + Fore.WHITE + str("https://www.imdb.com/title/" + data['imdbId']) + Style.RESET_ALL,
-                            movieRuntime = Style.BRIGHT + Fore.GREEN + str('{:02d}:{:02d}'.format(*divmod(data['runtime'], 60))) + Style.RESET_ALL ,
-                            movieWebsite = Style.BRIGHT + Fore.WHITE + str( data['website'] if 'website' in data else '') + Style.RESET_ALL,
-                            movieTitle = Style.BRIGHT + Fore.GREEN + str(data['title']) + Style.RESET_ALL,
-                            movieYear = Style.BRIGHT + Fore.GREEN + str(data['year']) + Style.RESET_ALL,
-                            movieOverview = textwrap.fill( data['overview'], media_form.width - 1) ,
-                            movieStudio = Style.BRIGHT + Fore.RED + str(data['studio']) + Style.RESET_ALL,
-                            moviePath = Style.BRIGHT + Fore.CYAN + str(data['path']) + Style.RESET_ALL,
-                            movieGenre = Style.BRIGHT + Fore.YELLOW + str(", ".join( data['genres'] ) if len(data['genres']) > 0 else 'Unknown') + Style.RESET_ALL
-                        )
-                    except Exception as e:
-                        output += str(e)
+                        movieStatus = Style.BRIGHT + Fore.WHITE + str(data['status']) + Style.RESET_ALL,
+                        movieInCinemas = Style.BRIGHT + Fore.GREEN + str(data['inCinemas'][:10]) + Style.RESET_ALL,
+                        moviePhysicalRelease = Style.BRIGHT + Fore.BLUE + (str(data['physicalRelease'] if 'physicalRelease' in data else '')[:10]) + Style.RESET_ALL,
+                        movieIMDB = Style.BRIGHT + Fore.WHITE + str("https://www.imdb.com/title/" + data['imdbId']) + Style.RESET_ALL,
+                        movieRuntime = Style.BRIGHT + Fore.GREEN + str('{:02d}:{:02d}'.format(*divmod(data['runtime'], 60))) + Style.RESET_ALL ,
+                        movieWebsite = Style.BRIGHT + Fore.WHITE + str( data['website'] if 'website' in data else '') + Style.RESET_ALL,
+                        movieTitle = Style.BRIGHT + Fore.GREEN + str(data['title']) + Style.RESET_ALL,
+                        movieYear = Style.BRIGHT + Fore.GREEN + str(data['year']) + Style.RESET_ALL,
+                        movieOverview = textwrap.fill( data['overview'], media_form.width - 1) ,
+                        movieStudio = Style.BRIGHT + Fore.RED + str(data['studio']) + Style.RESET_ALL,
+                        moviePath = Style.BRIGHT + Fore.CYAN + str(data['path']) + Style.RESET_ALL,
+                        movieGenre = Style.BRIGHT + Fore.YELLOW + str(", ".join( data['genres'] ) if len(data['genres']) > 0 else 'Unknown') + Style.RESET_ALL
+                    )
+                except Exception as e:
+                    output += str(e)
             else:
                 media_form.add_content('Please Wait...')
         else:
@@ -743,19 +4996,18 @@ Path: {moviePath}
         media_form.add_content(output)
         return media_form.render()
         
-    def render_procs(self, start_row):
+    def render_procs(self, rect):
         """Renders the running processes form."""
 
-        procs_form = Form('Processes', y=start_row, x=38, height=17, width=(int(self.columns) - 82))
+        procs_form = Form('Processes', *rect)
 
         procs = []
-        for proc in psutil.process_iter():
-            if proc:
+        for pinfo in self.collector.processes():
+            if pinfo:
                 try:
-                    pinfo = proc.as_dict(attrs=['pid', 'name', 'memory_percent', 'cpu_percent', 'cmdline'])
                     if pinfo['cpu_percent'] > .1 or pinfo['memory_percent'] > .1:
                         cmd = " ".join(pinfo['cmdline'])
-                        cmd = cmd.ljust(int(self.columns) - 110)[:int(self.columns) - 110]
+                        cmd = cmd.ljust(rect.width - 28)[:rect.width - 28]
                         if cmd.strip() != '':
                             procs.append({
                                 'pid' : pinfo['pid'],
@@ -765,14 +5017,14 @@ Path: {moviePath}
                             })
                 except:
                     procs.append({'pid' : 0, 'mem': 0, 'cpu': 0, 'cmd' : ''})
-        procs_form.add_content((Style.BRIGHT + Fore.BLUE + "{:>7}" + chr(179) + " {:>7}" + chr(179) +" {:>7}" + chr(179) + " {}" + Style.RESET_ALL + "\n").format('PID','CPU','MEM','Command Line' + (' '*(int(self.columns) - 121)  )))
+        procs_form.add_content((Style.BRIGHT + Fore.BLUE + "{:>7}" + chr(179) + " {:>7}" + chr(179) +" {:>7}" + chr(179) + " {}" + Style.RESET_ALL + "\n").format('PID','CPU','MEM','Command Line' + (' '*(rect.width - 39)  )))
         
                 
         procs.sort(key=lambda x: float(x['cpu']), reverse=True)
         count = 0
         for proc in procs:
             count += 1
-            if count < 17:
+            if count < rect.height:
                 cmd_style = Style.NORMAL + Fore.WHITE
                 mem_style = Style.NORMAL + Fore.WHITE
                 if proc['mem'] > 50:
@@ -816,10 +5068,10 @@ Path: {moviePath}
 
 
 
-    def render_disk_usage(self, paths):
-        """ Renders the disk usage form."""
-        disk_usage_form = Form('Disk Usage', x=1, y=1, width=228, height=16)
-        self.pct_disk_usage = int(self.columns) - 135
+    def render_disk_usage(self, rect, paths):
+        """ Renders the disk usage form, leaving out the usage bar when it would not fit."""
+        disk_usage_form = Form('Disk Usage', *rect)
+        self.pct_disk_usage = rect.width - 152
         line = [
                 Style.DIM    + Fore.MAGENTA + "{:>11}" + Style.RESET_ALL,
                 Style.BRIGHT + Fore.BLUE    + "{:22}" + Style.RESET_ALL,
@@ -827,6 +5079,7 @@ Path: {moviePath}
                 Style.BRIGHT + Fore.YELLOW  + "{:>18}" + Style.RESET_ALL,
                 Style.BRIGHT + Fore.GREEN   + "{:>18}" + Style.RESET_ALL,
                 Style.BRIGHT + Fore.CYAN    + "{:>18}" + Style.RESET_ALL,
+                Style.BRIGHT + Fore.MAGENTA + "{:>18}" + Style.RESET_ALL,
                 (
                     Style.BRIGHT +
                     Fore.GREEN   +
@@ -840,21 +5093,23 @@ Path: {moviePath}
                 Style.BRIGHT + Fore.WHITE   + "{:>5}"   + Style.RESET_ALL,
                 Style.BRIGHT + Fore.WHITE   + "{:>5}"   + Style.RESET_ALL
             ]
-        headers = (
-                (chr(179).join(line)).format(
-                    "DEVICE",
-                    "MOUNTPOINT",
-                    "TARGETSIZE",
-                    "USED",
-                    "FREE",
-                    "AVAILABLE",
-                    "USAGE",
-                    "PCT",
-                    "TEMP",
-                    "X264",
-                    "X265"
-                )
-            ) + "\n"
+        values = [
+                "DEVICE",
+                "MOUNTPOINT",
+                "TARGETSIZE",
+                "USED",
+                "FREE",
+                "AVAILABLE",
+                "PROJECTED",
+                "USAGE",
+                "PCT",
+                "TEMP",
+                "X264",
+                "X265"
+            ]
+        if self.pct_disk_usage < 10:
+            del line[7], values[7]
+        headers = (chr(179).join(line)).format(*values) + "\n"
             
         disk_usage_form.add_content(headers)
         for path in paths:
@@ -866,19 +5121,60 @@ Path: {moviePath}
         """ Generates the disk usage specifics on a specified path."""
 
         results = ""
-        self.pct_disk_usage = int(self.columns) - 135
 
-        root_directory = Path(path)
-        total_usage = sum(f.stat().st_size for f in root_directory.glob('**/*') if f.is_file())
+        inventory = self.collector.inventory(path)
+        total_usage = inventory['size']
         devices = self.get_devices(path)
         device_count = len(devices)
         targetsize = int(total_usage/device_count)
 
         devices.sort(key=lambda x: x.mountpoint)
+        partitions = [self.get_partition_info(p, inventory['mounts'].get(p.mountpoint)) for p in devices]
+
+        avc_files = [item for usage in partitions for item in usage['x264_files']]
+        analytics = Analytics(
+            avc_files,
+            [item for usage in partitions for item in usage['x265_files']],
+            [entry for entry in self.collector.encode_history() if entry.get('source', '').startswith(path)]
+        )
+        for usage in partitions:
+            usage['projected'] = analytics.get_projection(usage['used'], usage['x264_files'])
+
+        avc_bytes = sum(item['size'] for item in avc_files)
+        self.projections[path] = {
+            'total' : sum(usage['total'] for usage in partitions),
+            'used' : sum(usage['used'] for usage in partitions),
+            'projected' : sum(usage['projected'] for usage in partitions),
+            'ratio' : 1 - analytics.get_savings(avc_files) / avc_bytes if avc_bytes else analytics.fallback_ratio,
+            'samples' : analytics.samples
+        }
 
-        for p in devices:
-            usage = self.get_partition_info(p)
+        # kept for the browser dashboard, so it never walks or projects again
+        hevc_files = [item for usage in partitions for item in usage['x265_files']]
+        hevc_bytes = sum(item['size'] for item in hevc_files)
+        self.panels['roots'][path] = {
+            'x264' : len(avc_files),
+            'x265' : len(hevc_files),
+            'x264_bytes' : avc_bytes,
+            'x265_bytes' : hevc_bytes,
+            'avg_avc_size' : int(avc_bytes / len(avc_files)) if avc_files else 0,
+            'avg_hevc_size' : int(hevc_bytes / len(hevc_files)) if hevc_files else 0,
+            'total_bytes' : total_usage,
+            'capacity' : self.projections[path]['total'],
+            'projected' : self.projections[path]['projected'],
+            'hevc_ratio' : round(self.projections[path]['ratio'], 4)
+        }
+        self.panels['devices'][path] = []
+        for usage in partitions:
+            try:
+                temp = int(usage['temp'])
+            except Exception:
+                temp = None
+            device = {key : usage[key] for key in ('device', 'mountpoint', 'total', 'used', 'free', 'percent', 'x264', 'x265', 'projected')}
+            device.update({'temp' : temp, 'root' : path, 'target' : targetsize})
+            self.panels['devices'][path].append(device)
 
+        for p, usage in zip(devices, partitions):
             line = [
                 Style.DIM    + Fore.MAGENTA + "{:>11}" + Style.RESET_ALL,
                 Style.BRIGHT + Fore.BLUE    + "{:<22}" + Style.RESET_ALL,
@@ -886,6 +5182,7 @@ Path: {moviePath}
                 Style.BRIGHT + Fore.YELLOW  + "{:18,}" + Style.RESET_ALL,
                 Style.BRIGHT + Fore.GREEN   + "{:18,}" + Style.RESET_ALL,
                 Style.BRIGHT + Fore.CYAN    + "{:18,}" + Style.RESET_ALL,
+                Style.BRIGHT + Fore.MAGENTA + "{:18,}" + Style.RESET_ALL,
                 (
                     Style.BRIGHT +
                     Fore.WHITE   +
@@ -912,96 +5209,78 @@ Path: {moviePath}
                 percent_usage[int(targetsize/usage['total']*self.pct_disk_usage)+1:]
             )
 
-            results += (
-                (chr(179).join(line)).format(
+            values = [
                     p.device,
                     p.mountpoint,
                     targetsize,
                     usage['used'],
                     usage['free'],
                     targetsize - usage['used'],
+                    usage['projected'],
                     percent_usage,
                     usage['percent'],
                     usage['temp'],
                     usage['x264'],
                     usage['x265']
-                )
-            ) + "\n"
+                ]
+            if self.pct_disk_usage < 10:
+                del line[7], values[7]
+            results += (chr(179).join(line)).format(*values) + "\n"
         return results
 
-    def get_partition_info(self, part):
-        """ Gets information about the partitions used for a specified path."""
+    def get_partition_info(self, part, tree=None):
+        """ Gets information about the partitions used for a specified path, reusing a walk if given."""
 
-        usage = psutil.disk_usage(part.mountpoint)
+        usage = self.collector.disk_usage(part.mountpoint)
 
         diskval = {}
         diskval['device'] = part.device
         diskval['mountpoint'] = part.mountpoint
-        diskval['total'] = usage.total
-        diskval['used'] = usage.used
-        diskval['free'] = usage.free
-        diskval['percent'] = usage.percent
-        diskval['temp'] = (
-            subprocess.check_output(['hddtemp', '--numeric', part.device]).decode('ascii').strip()
-        )
+        diskval['total'] = usage['total']
+        diskval['used'] = usage['used']
+        diskval['free'] = usage['free']
+        diskval['percent'] = usage['percent']
+        diskval['temp'] = self.collector.disk_temp(part.device)
 
-        file_list = []
-        for d_name, sd_name, f_list in os.walk(part.mountpoint):
-            for file_name in f_list:
-                if(
-                        not fnmatch.fnmatch(file_name, '*265*') and
-                        not fnmatch.fnmatch(file_name, '*HEVC*')
-                ):
-                    if os.path.exists( os.path.join(d_name, file_name) ):
-                        size = os.stat(os.path.join(d_name, file_name)).st_size
-                    else:
-                        size = 0
-                    
-                    if size > 200000000:
-                        file_list.append(os.path.join(d_name, file_name))
-        diskval['x264'] = len(file_list)
-
-        file_list = []
-        for d_name, sd_name, f_list in os.walk(part.mountpoint):
-            for file_name in f_list:
-                if fnmatch.fnmatch(file_name, '*265*') or fnmatch.fnmatch(file_name, '*HEVC*'):
-                    if os.path.exists( os.path.join(d_name, file_name) ):
-                        size = os.stat(os.path.join(d_name, file_name)).st_size
-                    else:
-                        size = 0
-                        
-                    if size > 200000000:
-                        file_list.append(os.path.join(d_name, file_name))
-        diskval['x265'] = len(file_list)
+        if tree is None:
+            tree = {
+                'x264' : self.collector.media_files(part.mountpoint),
+                'x265' : self.collector.media_files(part.mountpoint, hevc=True)
+            }
+        diskval['x264_files'] = tree['x264']
+        diskval['x265_files'] = tree['x265']
+        diskval['x264'] = len(diskval['x264_files'])
+        diskval['x265'] = len(diskval['x265_files'])
         return diskval
 
     def get_devices(self, path):
         """ Gets all block devices."""
-        return list(filter(lambda x: (path in x.mountpoint), psutil.disk_partitions()))
+        return list(filter(lambda x: (path in x.mountpoint), self.collector.partitions()))
         
-    def render_cpu_percent(self, start_row):
-        cpus = psutil.cpu_percent(interval=0.1, percpu=True)
+    def render_cpu_percent(self, rect):
+        cpus = self.collector.cpu_percent()
         
-        cpu_percent_form = Form('CPU Percentage', y=start_row, x=( int(self.columns) - ( 2*len(cpus) + 5) ), width=( 2*len(cpus) + 5), height=22)
+        cpu_percent_form = Form('CPU Percentage', *rect)
         output = ""
+        levels = rect.height - 2
         
-        for r in range(0,20):
-            if r % 5 == 0:
+        for r in range(0, levels):
+            if r % max(1, levels // 4) == 0:
                 output += "-" + chr(179) + " "
             else:
                 output += " " + chr(179) + " "
             
             for c in cpus:
-                if ((20-r)/20*100) > 75:
+                if ((levels-r)/levels*100) > 75:
                     output += Fore.RED
-                elif ((20-r)/20*100) > 50:
+                elif ((levels-r)/levels*100) > 50:
                     output += Fore.YELLOW
-                elif ((20-r)/20*100) > 25:
+                elif ((levels-r)/levels*100) > 25:
                     output += Fore.GREEN
                 else:
                     output += Fore.CYAN
                 
-                if c > ((20-r)/20*100):
+                if c > ((levels-r)/levels*100):
                     output += chr(219) + " "
                 else:
                     output += "  "
@@ -1012,82 +5291,31 @@ Path: {moviePath}
         for r in range(0, ( 2*len(cpus) + 2) ):
             output += chr(196)
         output += "\n"
-        n1, n5, n15 = [x / psutil.cpu_count() * 100 for x in psutil.getloadavg()]
+        n1, n5, n15 = self.collector.load_average()
         output += "Load: 1M:{:6} 5M:{:6} 15M:{:6}".format( str(round(n1,2)),str(round(n5,2)),str(round(n15,2)))
         
         cpu_percent_form.add_content(output)
         return cpu_percent_form.render()
     
-    def render_disk_visualization(self, start_row):
-        cpus = psutil.cpu_percent(percpu=True)
-        disk_vis_form = Form('Disk Visualization', y=start_row, x=(int(self.columns)-( 2*len(cpus) + 7) - 75), width=76, height=22)
+    def render_disk_visualization(self, rect):
+        disk_vis_form = Form('Disk Visualization', *rect)
         mountpoint = str( '/'.join( self.current_file.split('/')[0:4] ) )
-        devices = list(filter(lambda x: (mountpoint in x.mountpoint), psutil.disk_partitions()))
+        devices = list(filter(lambda x: (mountpoint in x.mountpoint), self.collector.partitions()))
         
         if mountpoint.strip() != '' and self.current_partition != devices[0].device:        
             self.current_partition = devices[0].device
-            outputmap = list()
-            for i in range(1500):
-                outputmap.append( 0 )
-        
-            root_directory = Path(mountpoint)
-            for f in root_directory.glob('**/*'):
-                if f.is_file() and all(ord(c) < 128 for c in str(f)):
-                    fileinfo = subprocess.check_output(
-                        [
-                            'filefrag', 
-                            '-b512',
-                            '-e',
-                            str(f)
-                        ],
-                        stderr=None
-                    ).decode('ascii').split("\n")
-                    
-                    
-                    for i in fileinfo[3:-1]:
-                        fields = i.split(':')
-                        if len(fields) >= 3 and "Storage" not in fields[0] and fields[2] is not None:                        
-                            data = fields[2].split('.')[0]
-                            try:
-                                maploc = int( int( data ) / 7814035087 *  ( ( int(disk_vis_form.width) - 1 ) * ( int(disk_vis_form.height) - 2 ) ) )
-                                outputmap[ maploc ] =  int(outputmap[ maploc ]) + 1 
-
-                            except Exception as e:
-                                print(str(e))
-                                print(str(f))
-            
+            # the whole map is one cell per character of the form, above the scale
+            cells = (rect.width - 1) * (rect.height - 2)
+            outputmap = list(self.collector.extent_map(mountpoint, cells))
+
             index = 0
             results = ""
             line = ""
-            # Utils.clear()
-            # print(max(outputmap))
-            # print(outputmap)
-            # time.sleep(10)
-            
-            
-            fileinfo = subprocess.check_output(
-                [
-                    'filefrag', 
-                    '-b512',
-                    '-e',
-                    str(self.current_file)
-                ],
-                stderr=None
-            ).decode('ascii').split("\n")
-            
-            
-            for i in fileinfo[3:-1]:
-                fields = i.split(':')
-                if len(fields) >= 3 and "Storage" not in fields[0] and fields[2] is not None:                        
-                    data = fields[2].split('.')[0]
-                    try:
-                        maploc = int( int( data ) / 7814035087 *  ( ( int(disk_vis_form.width) - 1 ) * ( int(disk_vis_form.height) - 2 ) ) )
-                        outputmap[ maploc ] =  -1
 
-                    except Exception as e:
-                        print(str(e))
-                        print(str(f))
-                        
+            for maploc in self.collector.file_extents(self.current_file, cells):
+                if 0 <= maploc < len(outputmap):
+                    outputmap[maploc] = -1
+
             for c in outputmap:
                 index += 1
                 
@@ -1164,11 +5392,10 @@ Path: {moviePath}
         else:
             return 0
         
-    def render_speed_histogram(self, start_row):
-        cpus = psutil.cpu_percent(percpu=True)
-        speed_bar_form = Form('Speed Histogram', y=start_row, x=1, width=(int(self.columns)-( 2*len(cpus) + 7) - 77), height=22)
+    def render_speed_histogram(self, rect):
+        speed_bar_form = Form('Speed Histogram', *rect)
         speeds = []
-        self.conversion_speeds = Media.get_conversion_speeds()
+        self.conversion_speeds = self.collector.conversion_speeds()
         # if len(self.conversion_speeds) < 500:
             # output = "Processing, please wait...\n"
         # else:
@@ -1178,43 +5405,40 @@ Path: {moviePath}
         for chunk in speed_chunks:
             speeds.append( max(chunk) )
         
-        while len(speeds) < 110:
+        while len(speeds) < rect.width - 8:
             speeds.insert(0, 0)
             
-        speeds.reverse()
-        speeds = speeds[0:105]
-        speeds.reverse()
+        speeds = speeds[len(speeds) - (rect.width - 8):]
         res_max = max(float(speed) for speed in speeds) 
         
         if res_max < 5:
             res_max = 5
 
         output = ""
-        for r in range(0,20):
+        levels = rect.height - 2
+        for r in range(0, levels):
             if r == 0:
                 output += ("{:>5} " + chr(179)).format( (str(round(res_max,2)) ) )
-            elif r == 5:
+            elif r == levels // 4:
                 output += ("{:>5} " + chr(179)).format( (str(round(3*res_max/4,2)) ) )
-            elif r == 10:
+            elif r == levels // 2:
                 output += ("{:>5} " + chr(179)).format( (str(round(res_max/2,2)) ) )
-            elif r == 15:
+            elif r == 3 * levels // 4:
                 output += ("{:>5} " + chr(179)).format( (str(round(res_max/4,2)) ) )
-            elif r == 20:
-                output += ("{:>5} " + chr(179)).format( "0" )
             else:
                 output += ("{:>5} " + chr(179)).format( "_" )
                 
             for speed in speeds:
-                if r < 5:
+                if r < levels / 4:
                     output += Fore.RED
-                elif r < 10:
+                elif r < levels / 2:
                     output += Fore.YELLOW
-                elif r < 15:
+                elif r < 3 * levels / 4:
                     output += Fore.GREEN
                 else:
                     output += Fore.CYAN
                     
-                if int(20*speed/res_max) >= 20 - r:
+                if int(levels*speed/res_max) >= levels - r:
                     output += chr(254)
                 else:
                     output += " "
@@ -1222,8 +5446,8 @@ Path: {moviePath}
             output += "\n"
         
         xaxis = ""
-        for c in range(0, (int(self.columns)-( 2*len(cpus) + 8 ) - 77 ) ):
-            if (int(self.columns)-c + 2) % 25 == 0:
+        for c in range(0, rect.width - 1 ):
+            if (rect.width - c) % 25 == 0:
                 xaxis += chr(193)
             else:
                 xaxis += chr(196)
@@ -1237,46 +5461,187 @@ Path: {moviePath}
     
 def main():
     # pylint: disable=C0103
-    colorama.init()
-    Utils.clear()
-    cw = CompressionWatcher()
-    steps = 0
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--record', metavar='FILE', help='append every collected snapshot to a compressed recording')
+    parser.add_argument('--replay', metavar='FILE', help='drive the forms from a recording instead of the live system')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier, 0 replays as fast as possible')
+    parser.add_argument('--plan-queue', metavar='FILE', help='write the x264 backlog to FILE ordered by bytes saved per encode hour and exit')
+    parser.add_argument('--probe-seconds', type=float, default=30, help='time spent probing uncached files while planning')
+    parser.add_argument('--rebalance', metavar='PATH', help='plan moving whole folders so each device under PATH reaches its target size and exit')
+    parser.add_argument('--tolerance', type=float, default=1.0, help='percent of the target size a device may be off by when rebalancing')
+    parser.add_argument('--execute', action='store_true', help='perform the rebalance moves instead of only reporting them')
+    parser.add_argument('--rate', type=float, default=50, help='rebalance copy rate limit in MB/s')
+    parser.add_argument('--scan-metadata', action='store_true', help='probe every library file missing from the metadata cache and exit')
+    parser.add_argument('--workers', type=int, help='metadata scan worker processes, a quarter of the CPUs by default')
+    parser.add_argument('--scan-rate', type=float, default=4, help='metadata scan limit in files per second, 0 for no limit')
+    parser.add_argument('--stat-rate', type=float, default=2000, help='library scan limit in stats per disk per second, 0 for no limit')
+    parser.add_argument('--busy-util', type=float, default=80, help='utilization percent of the encode disk above which scans of it slow to a tenth')
+    parser.add_argument('--prefetch', action='store_true', help='warm the page cache with the next source near the end of each encode')
+    parser.add_argument('--prefetch-queue', metavar='FILE', help='queue file the encoder works through, the backlog in path order otherwise')
+    parser.add_argument('--prefetch-rate', type=float, default=20, help='prefetch read ahead limit in MB/s')
+    parser.add_argument('--prefetch-lead', type=float, default=600, help='seconds before the end of an encode to start the prefetch')
+    parser.add_argument('--governor', action='store_true', help='narrow or pause the encoder to hold the CPU at --target-temp')
+    parser.add_argument('--target-temp', type=float, default=72, help='CPU temperature the governor holds, in degrees C')
+    parser.add_argument('--daemon', metavar='FILE', help='collect without drawing and publish each frame to FILE for --attach viewers')
+    parser.add_argument('--attach', metavar='FILE', help='draw the forms from the snapshots a --daemon publishes to FILE')
+    parser.add_argument('--http', type=int, metavar='PORT', help='also serve a browser view of the main panels on PORT')
+    parser.add_argument('--ingest-logs', action='store_true', help='add the encodes in rotated .1, .gz and .xz logs to the history and exit')
+    parser.add_argument('--duplicates', action='store_true', help='report x264 copies next to their x265 encode and identical files, then exit')
+    parser.add_argument('--no-verify', action='store_true', help='do not check the x265 output of each finished encode')
+    parser.add_argument('--webhook', metavar='URL', help='post stall, slowdown and idle alerts and their recoveries to URL as JSON')
+    parser.add_argument('--stall-seconds', type=float, default=120, help='alert when the encode makes no progress for this long')
+    parser.add_argument('--slow-seconds', type=float, default=300, help='alert when the encode runs below half its usual speed for this long')
+    parser.add_argument('--idle-seconds', type=float, default=900, help='alert when no encode runs for this long while x264 files remain')
+    parser.add_argument('--report', choices=['json', 'csv'], help='collect the statistics once, write them without a terminal and exit')
+    parser.add_argument('--output', metavar='FILE', help='write the report to FILE instead of stdout')
+    args = parser.parse_args()
+    Media.budget = IOBudget(args.stat_rate, args.busy_util)
 
-    while True:
-        cw.rows, cw.columns = os.popen('stty size', 'r').read().split()
-        
-        disk_usage_row = cw.render_disk_usage(['/Storage/Television/', '/Storage/Movies/'])
-        summary_row = cw.render_summary(disk_usage_row)
-        proc_row = cw.render_procs(disk_usage_row)
-        
-        file_data_row = cw.render_file_data(summary_row)
-        poster_row = cw.render_poster(disk_usage_row)
-        media_row = cw.render_media_info(proc_row)
-        conversions_row = cw.render_conversions(media_row)
-        histogram_row = cw.render_speed_histogram(conversions_row)
-        disk_vis_row = cw.render_disk_visualization(conversions_row)
-        
-        prog_row = cw.render_progress(histogram_row, steps, clear=False)
-        cpu_percent_row = cw.render_cpu_percent(conversions_row)
-        
-        
-        
-        steps = 0
-        while steps < 60:
-            steps += 1
-            cw.render_procs(disk_usage_row)
-            file_data = cw.render_file_data(summary_row)
-            if(file_data == -1):
-                steps = 61
-            conversions_row = cw.render_conversions(media_row)
-            
-            histogram_row = cw.render_speed_histogram(conversions_row)
-            prog_row = cw.render_progress(histogram_row, steps, clear=False)
-            cpu_percent_row = cw.render_cpu_percent(conversions_row)
-            
-            time.sleep(1)
-        
-        cw.render_progress(histogram_row, steps, clear=True)
+    if args.report:
+        report = Report().collect()
+        if args.output:
+            with open(args.output + '.tmp', 'w', newline='') as output:
+                Report.write(report, output, args.report)
+            os.replace(args.output + '.tmp', args.output)
+        else:
+            Report.write(report, sys.stdout, args.report)
+        return
+
+    if args.duplicates:
+        print(DuplicateDetector.report(*DuplicateDetector().detect()))
+        return
+
+    if args.ingest_logs:
+        print("{} encodes added to the history".format(LogIngester().ingest()))
+        return
+
+    if args.rebalance:
+        planner = RebalancePlanner(args.rebalance, args.tolerance / 100)
+        folders = planner.get_folders()
+        moves, sizes, target = planner.plan(folders)
+        print(planner.report(folders, moves, sizes, target))
+        if args.execute:
+            planner.execute(moves, args.rate * 1024 * 1024)
+        return
+
+    if args.scan_metadata:
+        scanner = MetadataScanner(MetadataCache(), args.workers, args.scan_rate)
+        pending = scanner.get_pending()
+        print("{} files to probe with {} workers".format(len(pending), scanner.workers))
+        probed = scanner.scan(pending)
+        print("{} files probed, {} failed".format(probed, scanner.failed))
+        return
+
+    if args.plan_queue:
+        collector = Collector()
+        try:
+            speeds = collector.conversion_speeds()
+        except OSError:
+            speeds = []
+        planner = QueuePlanner(MetadataCache(), collector.encode_history(), speeds)
+        ranked = planner.plan(args.plan_queue, args.probe_seconds)
+        print("{:>10} {:>18} {:>8} {:>16}  {}".format('RANK', 'SAVED', 'HOURS', 'SAVED/HOUR', 'PATH'))
+        for rank, item in enumerate(ranked[:25]):
+            print("{:>10} {:>18,} {:>8.2f} {:>16,}  {}".format(rank + 1, item['saved'], item['hours'], int(item['score']), item['path']))
+        print("{} files queued in {}".format(len(ranked), args.plan_queue))
+        return
+
+    publisher = None
+    if args.replay:
+        collector = ReplayCollector(args.replay, args.speed)
+    elif args.attach:
+        collector = SnapshotViewer(args.attach)
+    else:
+        collector = Collector(SnapshotRecorder(args.record) if args.record else None)
+        if args.daemon:
+            publisher = SnapshotPublisher(args.daemon)
+
+    cw = CompressionWatcher(collector)
+    if not args.no_verify and not args.replay and not args.attach:
+        cw.verifier = EncodeVerifier()
+    if args.prefetch and not args.replay and not args.attach:
+        cw.prefetcher = PagePrefetcher(args.prefetch_queue, args.prefetch_rate, args.prefetch_lead)
+    if publisher:
+        devnull = open(os.devnull, 'w')
+    else:
+        colorama.init()
+        Utils.clear()
+
+    # viewers redraw when the daemon publishes, not on their own timers
+    scheduler = RefreshScheduler(timed=not args.attach)
+    pending = {'resize'}
+
+    dashboard = DashboardServer(args.http) if args.http else None
+
+    governor = None
+    if args.governor and not args.replay and not args.attach:
+        governor = ThermalGovernor(
+            collector.cpu_temp,
+            collector.progress,
+            target=args.target_temp
+        )
+
+    watchdog = None
+    if args.webhook and not args.replay and not args.attach:
+        watchdog = StallWatchdog(
+            args.webhook,
+            collector,
+            args.stall_seconds,
+            args.slow_seconds,
+            args.idle_seconds,
+            source=lambda: cw.current_file,
+            paused=governor.holding if governor else None
+        )
+
+    try:
+        while True:
+            collector.tick()
+            events = collector.events(pending)
+            now = collector.now()
+            active = cw.current_file != ""
+
+            due = scheduler.due(events, now, active)
+            if publisher:
+                if cw.layout is None:
+                    cw.set_layout(*SnapshotPublisher.layout)
+                with contextlib.redirect_stdout(devnull):
+                    rendered = cw.render_forms(due, scheduler.step(now))
+                publisher.publish(collector, rendered, scheduler.step(now), now)
+            else:
+                if 'resize' in events:
+                    cw.set_layout(*Utils.get_terminal_size())
+                    Utils.clear()
+                step = collector.step if args.attach else scheduler.step(now)
+                rendered = cw.render_forms(due, step)
+
+            if dashboard:
+                dashboard.update(cw, rendered)
+
+            if governor:
+                governor.step(collector.now())
+
+            if watchdog:
+                watchdog.step(collector.now())
+
+            active = cw.current_file != ""
+            pending = collector.wait_for_events(scheduler.timeout(collector.now(), active), scheduler.probe(active))
+    except ReplayFinished:
+        Utils.clear()
+        print(collector.summary())
+    finally:
+        if governor:
+            governor.release()
+        if publisher:
+            publisher.close()
+        if dashboard:
+            dashboard.close()
+        if cw.verifier:
+            cw.verifier.close()
+        if watchdog:
+            watchdog.close()
+        if cw.prefetcher:
+            cw.prefetcher.stop()
+        collector.close()
     # pylint: enable=C0103
 
 if __name__ == "__main__":